@@ -1,5 +1,7 @@
 from aiohttp import web
 
+from engine.address_book import valid_address
+
 
 def setup_internal_routes(app: web.Application):
     app.router.add_post("/internal/register", handle_register)
@@ -18,6 +20,12 @@ async def handle_register(request: web.Request) -> web.Response:
 
     db = request.app["db"]
     fe = await db.register_frontend(license_key, telegram_id)
+    request.app["stream_hub"].add(license_key)
+    request.app["broadcaster"].forget(license_key)
+    if fe["udp_host"] and fe["udp_port"]:
+        address_book = request.app["address_book"]
+        address_book.set(license_key, fe["udp_host"], fe["udp_port"])
+        await request.app["broadcaster"].probe([address_book.get(license_key)])
     return web.json_response({"ok": True, "id": fe["id"]})
 
 
@@ -32,12 +40,19 @@ async def handle_set_address(request: web.Request) -> web.Response:
             {"error": "license_key, udp_host, and udp_port are required"}, status=400
         )
 
+    if not valid_address(udp_host, udp_port):
+        return web.json_response({"error": "Invalid udp_host or udp_port"}, status=400)
+
     db = request.app["db"]
     fe = await db.get_frontend(license_key)
     if not fe:
         return web.json_response({"error": "Frontend not found"}, status=404)
 
     await db.set_frontend_address(license_key, udp_host, int(udp_port))
+    address_book = request.app["address_book"]
+    address_book.set(license_key, udp_host, int(udp_port))
+    request.app["broadcaster"].forget(license_key)
+    await request.app["broadcaster"].probe([address_book.get(license_key)])
     return web.json_response({"ok": True})
 
 
@@ -50,6 +65,9 @@ async def handle_delete(request: web.Request) -> web.Response:
 
     db = request.app["db"]
     await db.delete_frontend(license_key)
+    request.app["address_book"].remove(license_key)
+    request.app["broadcaster"].forget(license_key)
+    await request.app["stream_hub"].remove(license_key)
     return web.json_response({"ok": True})
 
 
@@ -0,0 +1,17 @@
+from aiohttp import web
+
+from engine import metrics
+
+
+def setup_metrics_routes(app: web.Application):
+    app.router.add_get("/metrics", handle_metrics)
+
+
+async def handle_metrics(request: web.Request) -> web.Response:
+    # The only values computed at scrape time; everything else is kept up to date in place
+    metrics.FRONTENDS.set(len(request.app["address_book"]), "udp")
+    metrics.FRONTENDS.set(len(request.app["stream_hub"]), "stream")
+    return web.Response(
+        text=metrics.render(),
+        headers={"Content-Type": "text/plain; version=0.0.4; charset=utf-8"},
+    )
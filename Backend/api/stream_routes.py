@@ -0,0 +1,9 @@
+from aiohttp import web
+
+
+def setup_stream_routes(app: web.Application):
+    app.router.add_get("/stream", handle_stream)
+
+
+async def handle_stream(request: web.Request) -> web.StreamResponse:
+    return await request.app["stream_hub"].handle(request)
@@ -10,7 +10,18 @@ UDP_PORT = int(os.getenv("UDP_PORT", "9100"))
 SERVER_API_ID = int(os.getenv("SERVER_API_ID", "0"))
 SERVER_API_HASH = os.getenv("SERVER_API_HASH", "")
 SERVER_SESSION_STRING = os.getenv("SERVER_SESSION_STRING", "")
+# Comma-separated pool of scanner sessions; falls back to the single session
+SERVER_SESSION_STRINGS = [
+    s.strip()
+    for s in os.getenv("SERVER_SESSION_STRINGS", SERVER_SESSION_STRING).split(",")
+    if s.strip()
+]
 LICENSE_SERVER_URL = os.getenv("LICENSE_SERVER_URL", "https://82.148.18.168:8080")
 INTERNAL_API_SECRET = os.getenv("INTERNAL_API_SECRET", "")
 DB_PATH = os.getenv("BACKEND_DB_PATH", "backend.db")
 SCAN_INTERVAL = float(os.getenv("SCAN_INTERVAL", "1.0"))
+SCAN_BURST_INTERVAL = float(os.getenv("SCAN_BURST_INTERVAL", "0.25"))
+SCAN_BURST_WINDOW = float(os.getenv("SCAN_BURST_WINDOW", "30"))
+# Event loop lag probe and stall watchdog; logs the stack of callbacks that block the loop
+LOOP_MONITOR = os.getenv("LOOP_MONITOR", "0") == "1"
+LOOP_SLOW_THRESHOLD = float(os.getenv("LOOP_SLOW_THRESHOLD", "0.1"))
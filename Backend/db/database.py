@@ -1,7 +1,26 @@
+import functools
+import time
 from pathlib import Path
 
 import aiosqlite
 
+from engine.metrics import DB_QUERY_SECONDS
+
+
+def _timed(fn):
+    """Record the call's latency in DB_QUERY_SECONDS under the method name."""
+    name = fn.__name__
+
+    @functools.wraps(fn)
+    async def wrapper(*args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return await fn(*args, **kwargs)
+        finally:
+            DB_QUERY_SECONDS.observe(time.perf_counter() - started, name)
+
+    return wrapper
+
 
 class Database:
     def __init__(self, db_path: str):
@@ -24,6 +43,7 @@ class Database:
 
     # ── frontends ──
 
+    @_timed
     async def register_frontend(self, license_key: str, telegram_id: int | None = None) -> dict:
         await self._db.execute(
             "INSERT OR IGNORE INTO frontends (license_key, telegram_id) VALUES (?, ?)",
@@ -37,6 +57,7 @@ class Database:
         await self._db.commit()
         return await self.get_frontend(license_key)
 
+    @_timed
     async def get_frontend(self, license_key: str) -> dict | None:
         cur = await self._db.execute(
             "SELECT * FROM frontends WHERE license_key = ?", (license_key,)
@@ -44,6 +65,7 @@ class Database:
         row = await cur.fetchone()
         return dict(row) if row else None
 
+    @_timed
     async def set_frontend_address(self, license_key: str, udp_host: str, udp_port: int):
         await self._db.execute(
             "UPDATE frontends SET udp_host = ?, udp_port = ? WHERE license_key = ?",
@@ -51,6 +73,7 @@ class Database:
         )
         await self._db.commit()
 
+    @_timed
     async def get_all_frontends_with_address(self) -> list[dict]:
         cur = await self._db.execute(
             "SELECT * FROM frontends WHERE udp_host IS NOT NULL AND udp_port IS NOT NULL"
@@ -58,6 +81,13 @@ class Database:
         rows = await cur.fetchall()
         return [dict(r) for r in rows]
 
+    @_timed
+    async def get_all_license_keys(self) -> list[str]:
+        cur = await self._db.execute("SELECT license_key FROM frontends")
+        rows = await cur.fetchall()
+        return [r["license_key"] for r in rows]
+
+    @_timed
     async def delete_frontend(self, license_key: str):
         await self._db.execute(
             "DELETE FROM frontends WHERE license_key = ?", (license_key,)
@@ -66,11 +96,13 @@ class Database:
 
     # ── seen_gifts ──
 
+    @_timed
     async def get_seen_gift_ids(self) -> set[str]:
         cur = await self._db.execute("SELECT gift_id FROM seen_gifts")
         rows = await cur.fetchall()
         return {r["gift_id"] for r in rows}
 
+    @_timed
     async def add_seen_gifts(self, gift_ids: list[str]):
         if not gift_ids:
             return
@@ -0,0 +1,84 @@
+import ipaddress
+import logging
+import re
+from dataclasses import dataclass
+
+from .protocol import _derive_key
+
+logger = logging.getLogger(__name__)
+
+_HOST_LABEL = re.compile(r"(?!-)[A-Za-z0-9-]{1,63}(?<!-)")
+
+
+def valid_address(host: str, port) -> bool:
+    """Whether ``host``/``port`` could ever be resolved and sent to; checked
+    before an address is stored, so a typo can't reach the broadcaster."""
+    try:
+        if not 0 < int(port) < 65536:
+            return False
+    except (TypeError, ValueError):
+        return False
+    if not isinstance(host, str) or not host:
+        return False
+    try:
+        ipaddress.ip_address(host)
+        return True
+    except ValueError:
+        pass
+    try:
+        ascii_host = host.rstrip(".").encode("idna").decode("ascii")
+    except UnicodeError:
+        return False
+    labels = ascii_host.split(".")
+    return len(ascii_host) <= 253 and all(_HOST_LABEL.fullmatch(label) for label in labels)
+
+
+@dataclass(frozen=True)
+class Frontend:
+    license_key: str
+    addr: tuple[str, int]
+    key: bytes
+
+
+class AddressBook:
+    """In-memory copy of every frontend that has a UDP address.
+
+    Loaded from the database once at startup and kept current by the
+    ``/internal/*`` handlers, so the broadcast path never touches SQLite.
+    """
+
+    def __init__(self, db):
+        self._db = db
+        self._entries: dict[str, Frontend] = {}
+        self._snapshot: list[Frontend] | None = None
+
+    async def load(self):
+        rows = await self._db.get_all_frontends_with_address()
+        self._entries = {}
+        for fe in rows:
+            self.set(fe["license_key"], fe["udp_host"], fe["udp_port"])
+        logger.info("Address book loaded: %d frontends", len(self._entries))
+
+    def set(self, license_key: str, host: str, port: int):
+        self._entries[license_key] = Frontend(
+            license_key=license_key,
+            addr=(host, int(port)),
+            key=_derive_key(license_key),
+        )
+        self._snapshot = None
+
+    def remove(self, license_key: str):
+        if self._entries.pop(license_key, None):
+            self._snapshot = None
+
+    def get(self, license_key: str) -> Frontend | None:
+        return self._entries.get(license_key)
+
+    def frontends(self) -> list[Frontend]:
+        """Current frontends; the list is rebuilt only after a change."""
+        if self._snapshot is None:
+            self._snapshot = list(self._entries.values())
+        return self._snapshot
+
+    def __len__(self) -> int:
+        return len(self._entries)
@@ -1,84 +1,245 @@
 import asyncio
 import logging
+import os
+import time
 
 from telethon import TelegramClient
+from telethon.errors import FloodWaitError
 from telethon.sessions import StringSession
 
+from .address_book import AddressBook
+from .metrics import (
+    CATALOG_SIZE, NEW_GIFT_EVENTS, NEW_GIFTS, SCAN_CYCLE_SECONDS, SCAN_FLOOD_WAITS, SCAN_POLLS,
+    SCAN_RPC_ERRORS,
+)
+from .scan_scheduler import ScanScheduler
 from .telegram_api import get_star_gifts
 from .udp_broadcast import UdpBroadcaster
 
 logger = logging.getLogger(__name__)
 
+HEALTH_ALPHA = 0.2  # EWMA weight of the latest poll in a session's health score
+RECONNECT_AFTER_ERRORS = 5
+RECONNECT_MIN = 1.0  # seconds before retrying a session that failed to connect; doubles
+RECONNECT_MAX = 60.0
+
+
+class _ScanSession:
+    """One Telethon client polling the catalog on its own schedule."""
+
+    def __init__(self, index: int, session_string: str, scheduler: ScanScheduler):
+        self.index = index
+        self.session_string = session_string
+        self.scheduler = scheduler
+        self.client: TelegramClient | None = None
+        self.task: asyncio.Task | None = None
+        self.catalog_hash = 0
+        self.health = 1.0
+        self.errors = 0  # consecutive failed polls
+        self.flood_waits = 0
+        self.reconnect_delay = 0.0  # grows while connecting keeps failing
+
+    def record(self, ok: bool):
+        self.health = self.health * (1 - HEALTH_ALPHA) + (HEALTH_ALPHA if ok else 0.0)
+        self.errors = 0 if ok else self.errors + 1
+
 
 class GiftScanner:
+    """Polls the star gift catalog from a pool of sessions.
+
+    Sessions run on phases staggered by ``scan_interval / N``, so the pool
+    samples the catalog N times per interval. New gifts are deduplicated
+    through one shared seen-set no matter which session found them.
+    """
+
     def __init__(
         self,
         db,
         broadcaster: UdpBroadcaster,
+        address_book: AddressBook,
         api_id: int,
         api_hash: str,
-        session_string: str,
+        session_strings: list[str],
         scan_interval: float = 1.0,
+        burst_interval: float = 0.25,
+        burst_window: float = 30.0,
     ):
         self._db = db
         self._broadcaster = broadcaster
+        self._address_book = address_book
         self._api_id = api_id
         self._api_hash = api_hash
-        self._session_string = session_string
         self._scan_interval = scan_interval
-        self._client: TelegramClient | None = None
-        self._task: asyncio.Task | None = None
+        self._sessions = [
+            _ScanSession(i, s, ScanScheduler(scan_interval, burst_interval, burst_window))
+            for i, s in enumerate(session_strings)
+        ]
         self._running = False
+        self._seen: set[str] = set()
+        self.cycles_modified = 0
+        self.cycles_not_modified = 0
+        # Start of the latest poll, from any session, that found nothing new
+        self._last_unchanged = 0.0
 
     async def start(self):
-        self._client = TelegramClient(
-            StringSession(self._session_string),
-            self._api_id,
-            self._api_hash,
-            connection_retries=5,
+        if not self._sessions:
+            raise ValueError("GiftScanner needs at least one session string")
+
+        # Warm the seen-set once; SQLite is only durable storage from here on
+        self._seen = await self._db.get_seen_gift_ids()
+        logger.info("Loaded %d seen gifts", len(self._seen))
+
+        results = await asyncio.gather(
+            *(self._connect(sess) for sess in self._sessions),
+            return_exceptions=True,
         )
-        await self._client.connect()
-        logger.info("Scanner Telethon client connected")
+        live = [s for s, r in zip(self._sessions, results) if not isinstance(r, BaseException)]
+        for sess, r in zip(self._sessions, results):
+            if isinstance(r, BaseException):
+                logger.error("Scanner session #%d failed to connect, will retry: %s", sess.index, r)
+        if not live:
+            raise results[0]
 
+        # Every session gets its loop and phase, so one that failed to connect
+        # rejoins the pool in its own slot once a retry succeeds
         self._running = True
-        self._task = asyncio.create_task(self._loop())
-        logger.info("GiftScanner started (interval=%.1fs)", self._scan_interval)
+        phase = self._scan_interval / len(self._sessions)
+        for sess in self._sessions:
+            sess.task = asyncio.create_task(self._loop(sess, sess.index * phase))
+        logger.info(
+            "GiftScanner started (interval=%.1fs, sessions=%d/%d)",
+            self._scan_interval, len(live), len(self._sessions),
+        )
 
     async def stop(self):
         self._running = False
-        if self._task:
-            self._task.cancel()
-            try:
-                await self._task
-            except asyncio.CancelledError:
-                pass
-        if self._client:
+        for sess in self._sessions:
+            if sess.task:
+                sess.task.cancel()
+                try:
+                    await sess.task
+                except asyncio.CancelledError:
+                    pass
+                sess.task = None
+            await self._disconnect(sess)
+        logger.info("GiftScanner stopped")
+
+    def session_stats(self) -> list[dict]:
+        return [
+            {
+                "index": s.index,
+                "connected": bool(s.client and s.client.is_connected()),
+                "health": round(s.health, 3),
+                "errors": s.errors,
+                "flood_waits": s.flood_waits,
+                "in_burst": s.scheduler.in_burst,
+            }
+            for s in self._sessions
+        ]
+
+    async def _connect(self, sess: _ScanSession):
+        sess.client = TelegramClient(
+            StringSession(sess.session_string),
+            self._api_id,
+            self._api_hash,
+            connection_retries=5,
+            flood_sleep_threshold=0,
+        )
+        await sess.client.connect()
+        sess.catalog_hash = 0
+        logger.info("Scanner session #%d connected", sess.index)
+
+    async def _disconnect(self, sess: _ScanSession):
+        if sess.client:
             try:
-                await self._client.disconnect()
+                await sess.client.disconnect()
             except Exception:
                 pass
-            self._client = None
-        logger.info("GiftScanner stopped")
+            sess.client = None
 
-    async def _loop(self):
+    async def _loop(self, sess: _ScanSession, phase: float):
+        await asyncio.sleep(phase)
+        label = str(sess.index)
         while self._running:
+            if sess.client is None or not sess.client.is_connected():
+                # Never came up, or Telethon gave up on it: retry with backoff instead of polling
+                if not await self._reconnect(sess):
+                    await asyncio.sleep(sess.reconnect_delay)
+                    continue
+            started = time.monotonic()
+            reconnect = False
             try:
-                await self._scan_cycle()
+                await self._scan_cycle(sess)
+                sess.record(True)
             except asyncio.CancelledError:
                 break
+            except FloodWaitError as e:
+                # Only this session backs off; the rest of the pool keeps polling
+                logger.warning(
+                    "Scanner session #%d got FLOOD_WAIT %ds, backing off",
+                    sess.index, e.seconds,
+                )
+                sess.flood_waits += 1
+                SCAN_FLOOD_WAITS.inc(label)
+                sess.record(False)
+                sess.scheduler.record_flood_wait(e.seconds)
             except Exception as e:
-                logger.error("Scanner loop error: %s", e)
-            await asyncio.sleep(self._scan_interval)
+                logger.error("Scanner session #%d error: %s", sess.index, e)
+                SCAN_RPC_ERRORS.inc(label)
+                sess.record(False)
+                reconnect = sess.errors >= RECONNECT_AFTER_ERRORS
+            SCAN_CYCLE_SECONDS.observe(time.monotonic() - started)
+            if reconnect:
+                logger.warning(
+                    "Scanner session #%d unhealthy (health=%.2f), reconnecting",
+                    sess.index, sess.health,
+                )
+                await self._reconnect(sess)
+            await asyncio.sleep(sess.scheduler.delay(started))
 
-    async def _scan_cycle(self):
-        all_gifts = await get_star_gifts(self._client)
+    async def _reconnect(self, sess: _ScanSession) -> bool:
+        await self._disconnect(sess)
+        try:
+            await self._connect(sess)
+        except Exception as e:
+            sess.reconnect_delay = min(max(sess.reconnect_delay * 2, RECONNECT_MIN), RECONNECT_MAX)
+            logger.error(
+                "Scanner session #%d reconnect failed, retrying in %.0fs: %s",
+                sess.index, sess.reconnect_delay, e,
+            )
+            return False
+        sess.errors = 0
+        sess.reconnect_delay = 0.0
+        return True
+
+    async def _scan_cycle(self, sess: _ScanSession):
+        prev_hash = sess.catalog_hash
+        poll = time.time()
+        sess.catalog_hash, all_gifts = await get_star_gifts(sess.client, prev_hash)
+        seen = time.time()
+        # Read before any await: sessions finishing meanwhile may move it past this poll
+        prev = min(self._last_unchanged, poll) or poll
+        # The very first fetch is always "modified"; don't burst on startup
+        if all_gifts is not None and prev_hash != 0:
+            for s in self._sessions:
+                s.scheduler.start_burst()
+        sess.scheduler.record_cycle()
+        if all_gifts is None:
+            self.cycles_not_modified += 1
+            SCAN_POLLS.inc("not_modified")
+            self._last_unchanged = max(self._last_unchanged, poll)
+            return
+        self.cycles_modified += 1
+        SCAN_POLLS.inc("modified")
+        CATALOG_SIZE.set(len(all_gifts))
         if not all_gifts:
             return
 
-        seen = await self._db.get_seen_gift_ids()
-
-        new_gifts = [g for g in all_gifts if g["id"] and g["id"] not in seen]
+        # No await between the seen check and _add_seen updating the set, so
+        # two sessions can never both treat the same gift as new
+        new_gifts = [g for g in all_gifts if g["id"] and g["id"] not in self._seen]
         if not new_gifts:
+            self._last_unchanged = max(self._last_unchanged, poll)
             return
 
         # Mark unavailable gifts as seen immediately
@@ -91,20 +252,33 @@ class GiftScanner:
             if g["availability_remains"] is not None and g["availability_remains"] > 0
         ]
 
+        NEW_GIFTS.inc(amount=len(new_gifts))
         all_new_ids = [g["id"] for g in new_gifts]
-        await self._db.add_seen_gifts(all_new_ids)
+        await self._add_seen(all_new_ids)
 
         if not available:
             return
 
-        # Broadcast available new gifts to all frontends
-        frontends = await self._db.get_all_frontends_with_address()
-        if not frontends:
-            logger.debug("No frontends registered, skipping broadcast")
-            return
-
+        # Broadcast available new gifts to all frontends; the trace lets each
+        # frontend attribute the drop's latency to polling, fan-out or payment
+        trace = {
+            "id": os.urandom(8).hex(),
+            "prev": prev,
+            "poll": poll,
+            "seen": seen,
+        }
+        NEW_GIFT_EVENTS.inc()
+        frontends = self._address_book.frontends()
         logger.info(
-            "Broadcasting %d new gifts to %d frontends",
-            len(available), len(frontends),
+            "Session #%d broadcasting %d new gifts to %d frontends (trace %s)",
+            sess.index, len(available), len(frontends), trace["id"],
         )
-        await self._broadcaster.broadcast_gifts(frontends, available)
+        await self._broadcaster.broadcast_gifts(frontends, available, trace)
+
+    async def _add_seen(self, gift_ids: list[str]):
+        """Mark gifts seen in memory first, then persist them."""
+        self._seen.update(gift_ids)
+        try:
+            await self._db.add_seen_gifts(gift_ids)
+        except Exception as e:
+            logger.error("Failed to persist seen gifts: %s", e)
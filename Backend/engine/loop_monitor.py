@@ -0,0 +1,150 @@
+import asyncio
+import logging
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+PROBE_INTERVAL = 0.25  # seconds between lag probes
+SLOW_THRESHOLD = 0.1  # lag, or time spent in one callback, worth logging
+WINDOW = 240  # probes kept for the rolling summary (one minute at the default interval)
+REPORT_INTERVAL = 60.0  # seconds between summary lines, logged only after a slow probe
+
+_EVENTS_FILE = asyncio.events.__file__  # Handle._run, where the loop enters a callback
+
+
+class LoopMonitor:
+    """Opt-in event loop lag probe and stall watchdog.
+
+    A ``call_later`` probe re-arms itself every ``interval`` and records how
+    late it fired; that delay is the loop lag. A daemon thread watches the
+    probe's heartbeat and, once it is overdue by ``threshold``, samples the
+    loop thread's stack, so the callback that blocks the loop is logged while
+    it is still running. A healthy loop pays for one timer callback per
+    interval and nothing else.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        interval: float = PROBE_INTERVAL,
+        threshold: float = SLOW_THRESHOLD,
+        window: int = WINDOW,
+        report_interval: float = REPORT_INTERVAL,
+        on_lag=None,
+    ):
+        self._name = name
+        self._interval = interval
+        self._threshold = threshold
+        self._report_interval = report_interval
+        self._on_lag = on_lag  # on_lag(lag: float), called for every probe
+        self._lags: deque[float] = deque(maxlen=window)
+        self._slow = 0
+        self._blocked = 0
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._loop_thread: int | None = None
+        self._handle: asyncio.TimerHandle | None = None
+        self._expected = 0.0
+        self._beat = 0.0  # time.monotonic() of the last probe, read by the watchdog
+        self._next_report = 0.0
+        self._stop = threading.Event()
+        self._watchdog: threading.Thread | None = None
+
+    def start(self):
+        """Start probing the running loop; call from inside it."""
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread = threading.get_ident()
+        self._beat = time.monotonic()
+        self._next_report = self._beat + self._report_interval
+        self._stop.clear()
+        self._arm()
+        self._watchdog = threading.Thread(
+            target=self._watch, name=f"{self._name}-loop-watchdog", daemon=True,
+        )
+        self._watchdog.start()
+        logger.info(
+            "Loop monitor started for %s (probe %.0f ms, threshold %.0f ms)",
+            self._name, self._interval * 1000, self._threshold * 1000,
+        )
+
+    def stop(self):
+        if self._handle is not None:
+            self._handle.cancel()
+            self._handle = None
+        self._stop.set()
+        if self._watchdog is not None:
+            self._watchdog.join(timeout=self._interval * 2)
+            self._watchdog = None
+
+    def summary(self) -> dict:
+        """Lag over the last ``window`` probes, in milliseconds."""
+        lags = sorted(self._lags)
+        if not lags:
+            return {"probes": 0, "slow": self._slow, "blocked": self._blocked}
+
+        def pct(q: float) -> float:
+            return round(lags[min(int(q * len(lags)), len(lags) - 1)] * 1000, 2)
+
+        return {
+            "probes": len(lags),
+            "p50_ms": pct(0.5),
+            "p99_ms": pct(0.99),
+            "max_ms": round(lags[-1] * 1000, 2),
+            "slow": self._slow,
+            "blocked": self._blocked,
+        }
+
+    def _arm(self):
+        self._expected = self._loop.time() + self._interval
+        self._handle = self._loop.call_later(self._interval, self._probe)
+
+    def _probe(self):
+        lag = max(self._loop.time() - self._expected, 0.0)
+        self._beat = now = time.monotonic()
+        self._lags.append(lag)
+        if self._on_lag is not None:
+            self._on_lag(lag)
+        if lag >= self._threshold:
+            self._slow += 1
+            logger.warning("%s event loop lagged %.0f ms", self._name, lag * 1000)
+        if now >= self._next_report:
+            self._next_report = now + self._report_interval
+            # Quiet while healthy: a summary only follows a window with a slow probe
+            if max(self._lags) >= self._threshold:
+                logger.info("%s event loop lag: %s", self._name, self.summary())
+        self._arm()
+
+    def _watch(self):
+        reported = 0.0
+        while not self._stop.wait(self._interval):
+            beat = self._beat
+            overdue = time.monotonic() - beat - self._interval
+            if overdue < self._threshold or beat == reported:
+                continue
+            # One sample per stall: the loop is still inside the callback that blocks it
+            reported = beat
+            frame = sys._current_frames().get(self._loop_thread)
+            if frame is None:
+                continue
+            self._blocked += 1
+            stack = _callback_stack(frame)
+            del frame
+            logger.warning(
+                "%s event loop blocked for %.0f ms so far, in:\n%s",
+                self._name, overdue * 1000, stack.rstrip(),
+            )
+
+
+def _callback_stack(frame) -> str:
+    """Format ``frame``'s stack from the callback the loop is running, dropping
+    the ``asyncio.run`` / ``run_forever`` frames above it."""
+    frames = traceback.extract_stack(frame)
+    for i in range(len(frames) - 1, -1, -1):
+        if frames[i].name == "_run" and frames[i].filename == _EVENTS_FILE:
+            frames = frames[i + 1:]
+            break
+    return "".join(traceback.format_list(frames))
+
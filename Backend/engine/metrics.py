@@ -0,0 +1,160 @@
+import math
+from bisect import bisect_left
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help_text: str, labelnames: tuple[str, ...] = ()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = labelnames
+        REGISTRY.append(self)
+
+    def _labels(self, values: tuple, names: tuple[str, ...] | None = None) -> str:
+        if not values:
+            return ""
+        pairs = ",".join(
+            f'{k}="{_escape(str(v))}"' for k, v in zip(names or self.labelnames, values)
+        )
+        return "{" + pairs + "}"
+
+    def render(self) -> list[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help_text: str, labelnames: tuple[str, ...] = ()):
+        super().__init__(name, help_text, labelnames)
+        self._values: dict[tuple, float] = {} if labelnames else {(): 0.0}
+
+    def inc(self, *labels, amount: float = 1.0):
+        self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def render(self) -> list[str]:
+        lines = super().render()
+        lines.extend(f"{self.name}{self._labels(k)} {_fmt(v)}" for k, v in self._values.items())
+        return lines
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def set(self, value: float, *labels):
+        self._values[labels] = value
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        help_text: str,
+        labelnames: tuple[str, ...] = (),
+        buckets: tuple[float, ...] = LATENCY_BUCKETS,
+    ):
+        super().__init__(name, help_text, labelnames)
+        self._buckets = buckets
+        # labels -> [count per bucket (last one is +Inf), sum]
+        self._series: dict[tuple, list] = {}
+
+    def observe(self, value: float, *labels):
+        series = self._series.get(labels)
+        if series is None:
+            series = self._series[labels] = [[0] * (len(self._buckets) + 1), 0.0]
+        series[0][bisect_left(self._buckets, value)] += 1
+        series[1] += value
+
+    def render(self) -> list[str]:
+        lines = super().render()
+        for labels, (counts, total) in self._series.items():
+            cumulative = 0
+            for bound, n in zip(self._buckets + (math.inf,), counts):
+                cumulative += n
+                le = self._labels(labels + (_fmt(bound),), self.labelnames + ("le",))
+                lines.append(f"{self.name}_bucket{le} {cumulative}")
+            lines.append(f"{self.name}_sum{self._labels(labels)} {_fmt(total)}")
+            lines.append(f"{self.name}_count{self._labels(labels)} {cumulative}")
+        return lines
+
+
+def _fmt(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+# Every series is updated in place on the hot path (a dict lookup and an add),
+# so a scrape only formats numbers that already exist
+REGISTRY: list[_Metric] = []
+
+
+def render() -> str:
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+# ── scanner ──
+SCAN_CYCLE_SECONDS = Histogram(
+    "nftb_scan_cycle_seconds", "Duration of one catalog poll, including processing.",
+)
+SCAN_POLLS = Counter(
+    "nftb_scan_polls_total", "Catalog polls by outcome.", ("result",),
+)
+SCAN_RPC_ERRORS = Counter(
+    "nftb_scan_rpc_errors_total", "Failed catalog polls per scanner session.", ("session",),
+)
+SCAN_FLOOD_WAITS = Counter(
+    "nftb_scan_flood_waits_total", "FLOOD_WAIT errors per scanner session.", ("session",),
+)
+CATALOG_SIZE = Gauge(
+    "nftb_catalog_gifts", "Gifts in the star gift catalog at the last modified poll.",
+)
+NEW_GIFTS = Counter(
+    "nftb_new_gifts_total", "Gifts seen for the first time.",
+)
+NEW_GIFT_EVENTS = Counter(
+    "nftb_new_gift_events_total", "Broadcasts of newly available gifts.",
+)
+
+# ── broadcaster ──
+FANOUT_SECONDS = Histogram(
+    "nftb_broadcast_fanout_seconds", "Time to hand one new_gifts broadcast to every frontend.",
+)
+SEND_FAILURES = Counter(
+    "nftb_broadcast_send_failures_total",
+    "Datagrams that could not be sent, per frontend key id.",
+    ("frontend",),
+)
+DELIVERIES = Counter(
+    "nftb_broadcast_deliveries_total", "Tracked datagrams by final outcome.", ("result",),
+)
+RETRANSMITS = Counter(
+    "nftb_broadcast_retransmits_total", "Datagrams sent again after a missing ACK.",
+)
+FRONTENDS = Gauge(
+    "nftb_frontends", "Frontends known to the Backend, by transport.", ("transport",),
+)
+
+# ── database ──
+DB_QUERY_SECONDS = Histogram(
+    "nftb_db_query_seconds", "Latency of Database calls.", ("query",),
+)
+
+# ── event loop ──
+LOOP_LAG_SECONDS = Histogram(
+    "nftb_loop_lag_seconds", "How late the loop monitor's probe fired (only with LOOP_MONITOR=1).",
+)
@@ -0,0 +1,51 @@
+import time
+
+
+class ScanScheduler:
+    """Decides how long GiftScanner waits before the next catalog poll.
+
+    The delay is measured from the start of the previous cycle, so RPC time
+    is part of the period instead of being added on top of it. After a
+    catalog change the period drops to ``burst_interval`` for
+    ``burst_window`` seconds; FLOOD_WAIT stretches it until polls succeed.
+    """
+
+    def __init__(
+        self,
+        interval: float,
+        burst_interval: float = 0.25,
+        burst_window: float = 30.0,
+        max_penalty: float = 16.0,
+    ):
+        self._interval = interval
+        self._burst_interval = min(burst_interval, interval)
+        self._burst_window = burst_window
+        self._max_penalty = max_penalty
+        self._burst_until = 0.0
+        self._flood_until = 0.0
+        self._penalty = 1.0
+
+    @property
+    def in_burst(self) -> bool:
+        return time.monotonic() < self._burst_until
+
+    @property
+    def period(self) -> float:
+        base = self._burst_interval if self.in_burst else self._interval
+        return base * self._penalty
+
+    def start_burst(self):
+        self._burst_until = time.monotonic() + self._burst_window
+
+    def record_cycle(self):
+        # Each clean poll halves the flood penalty back towards 1
+        self._penalty = max(1.0, self._penalty / 2)
+
+    def record_flood_wait(self, seconds: float):
+        self._penalty = min(self._max_penalty, self._penalty * 2)
+        self._flood_until = time.monotonic() + seconds
+        self._burst_until = 0.0
+
+    def delay(self, cycle_started: float) -> float:
+        now = time.monotonic()
+        return max(0.0, cycle_started + self.period - now, self._flood_until - now)
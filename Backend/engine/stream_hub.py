@@ -0,0 +1,126 @@
+import asyncio
+import logging
+
+from aiohttp import WSMsgType, web
+
+from .protocol import (
+    FORMAT_JSON, _derive_key, key_id, negotiated_format, parse_message, sign_with_key,
+)
+
+logger = logging.getLogger(__name__)
+
+HELLO_TIMEOUT = 10.0  # seconds a new connection has to authenticate
+HEARTBEAT = 30.0
+SEND_TIMEOUT = 5.0
+
+
+class StreamHub:
+    """Long-lived WebSocket connections from frontends.
+
+    Frontends connect outbound to ``/stream?id=<key_id>`` and authenticate
+    with a signed ``hello`` frame; afterwards they receive the same signed
+    NFTB frames as the UDP path, with TCP providing ordered delivery.
+    """
+
+    def __init__(self, db):
+        self._db = db
+        self._keys: dict[str, str] = {}  # key_id -> license_key
+        self._conns: dict[str, set[web.WebSocketResponse]] = {}
+        self._formats: dict[web.WebSocketResponse, int] = {}
+
+    async def load(self):
+        for license_key in await self._db.get_all_license_keys():
+            self.add(license_key)
+        logger.info("Stream hub knows %d licenses", len(self._keys))
+
+    def add(self, license_key: str):
+        self._keys[key_id(license_key)] = license_key
+
+    async def remove(self, license_key: str):
+        self._keys.pop(key_id(license_key), None)
+        for ws in list(self._conns.pop(license_key, ())):
+            await ws.close()
+
+    def is_connected(self, license_key: str) -> bool:
+        return license_key in self._conns
+
+    def __len__(self) -> int:
+        return sum(len(c) for c in self._conns.values())
+
+    async def handle(self, request: web.Request) -> web.StreamResponse:
+        license_key = self._keys.get(request.query.get("id", ""))
+        if license_key is None:
+            raise web.HTTPForbidden(
+                text='{"error":"Unknown license"}', content_type="application/json",
+            )
+
+        ws = web.WebSocketResponse(heartbeat=HEARTBEAT, compress=False)
+        await ws.prepare(request)
+
+        try:
+            first = await ws.receive(timeout=HELLO_TIMEOUT)
+        except asyncio.TimeoutError:
+            await ws.close()
+            return ws
+        msg = parse_message(license_key, first.data) if first.type == WSMsgType.BINARY else None
+        if msg is None or msg.get("a") != "hello":
+            await ws.close(message=b"auth failed")
+            return ws
+
+        data = msg.get("d")
+        fmt = data.get("fmt", FORMAT_JSON) if isinstance(data, dict) else FORMAT_JSON
+        self._formats[ws] = negotiated_format(fmt)
+        self._conns.setdefault(license_key, set()).add(ws)
+        logger.info("Stream connected: %s... (%d open)", license_key[:8], len(self))
+        try:
+            # Frontends never send after hello; this just waits for close
+            async for _ in ws:
+                pass
+        finally:
+            self._formats.pop(ws, None)
+            conns = self._conns.get(license_key)
+            if conns is not None:
+                conns.discard(ws)
+                if not conns:
+                    del self._conns[license_key]
+            logger.info("Stream closed: %s...", license_key[:8])
+        return ws
+
+    async def push(self, payloads: dict[int, list[tuple[int, bytes]]]) -> set[str]:
+        """Send signed copies of the payloads to every open connection.
+
+        ``payloads`` maps a wire format to its ``(seq, payload)`` frames, as
+        produced by ``encode_gift_payloads``. Returns the license keys reached.
+        """
+        if not self._conns:
+            return set()
+        sends = []
+        json_payloads = payloads[FORMAT_JSON]
+        for license_key, conns in self._conns.items():
+            key = _derive_key(license_key)
+            for ws in conns:
+                fmt_payloads = payloads.get(self._formats.get(ws), json_payloads)
+                frames = [sign_with_key(key, p) for _, p in fmt_payloads]
+                sends.append((license_key, ws, frames))
+        results = await asyncio.gather(
+            *(asyncio.wait_for(self._send(ws, frames), SEND_TIMEOUT) for _, ws, frames in sends),
+            return_exceptions=True,
+        )
+        reached = set()
+        for (license_key, ws, _), r in zip(sends, results):
+            if isinstance(r, BaseException):
+                logger.warning("Stream send to %s... failed: %s", license_key[:8], r)
+                await ws.close()
+            else:
+                reached.add(license_key)
+        return reached
+
+    @staticmethod
+    async def _send(ws: web.WebSocketResponse, frames: list[bytes]):
+        for frame in frames:
+            await ws.send_bytes(frame)
+
+    async def close(self):
+        for conns in list(self._conns.values()):
+            for ws in list(conns):
+                await ws.close()
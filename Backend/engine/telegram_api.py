@@ -2,6 +2,9 @@ import asyncio
 import logging
 
 from telethon import TelegramClient
+from telethon.errors import FloodWaitError
+
+from .tl_compat import tl
 
 logger = logging.getLogger(__name__)
 
@@ -11,6 +14,9 @@ async def _retry(fn, attempts: int = 3, base_delay: float = 0.5):
     for i in range(attempts):
         try:
             return await fn()
+        except FloodWaitError:
+            # Retrying only extends the ban; let the caller back off
+            raise
         except Exception as e:
             last_err = e
             delay = base_delay * (2 ** i)
@@ -19,29 +25,28 @@ async def _retry(fn, attempts: int = 3, base_delay: float = 0.5):
     raise last_err
 
 
-async def get_star_gifts(client: TelegramClient) -> list[dict]:
-    from telethon.tl import functions as tl_functions
-    from telethon import _tl as Api
+async def get_star_gifts(
+    client: TelegramClient, gifts_hash: int = 0,
+) -> tuple[int, list[dict] | None]:
+    """Fetch the star gift catalog.
+
+    Pass the hash from the previous response as ``gifts_hash``; when the
+    catalog is unchanged Telegram replies with ``starGiftsNotModified`` and
+    ``(gifts_hash, None)`` is returned without parsing anything.
+    """
+    GetStarGifts = tl("payments.GetStarGiftsRequest")
 
     async def _call():
-        Ctor = getattr(getattr(Api, "payments", None), "GetStarGiftsRequest", None)
-        if Ctor is None:
-            Ctor = getattr(getattr(tl_functions, "payments", None), "GetStarGiftsRequest", None)
-        if Ctor is None:
-            try:
-                from telethon.tl.functions.payments import GetStarGiftsRequest as Ctor2
-                Ctor = Ctor2
-            except ImportError:
-                pass
-        if Ctor is None:
-            raise ImportError("GetStarGiftsRequest not found in Telethon")
-
-        res = await client(Ctor())
+        res = await client(GetStarGifts(hash=gifts_hash))
+        if type(res).__name__ == "StarGiftsNotModified":
+            return gifts_hash, None
+
+        new_hash = _to_int(getattr(res, "hash", 0))
         gifts_raw = getattr(res, "gifts", None)
         if gifts_raw is None and isinstance(res, (list, tuple)):
             gifts_raw = res
         if gifts_raw is None:
-            return []
+            return new_hash, []
 
         result = []
         for g in gifts_raw:
@@ -55,7 +60,7 @@ async def get_star_gifts(client: TelegramClient) -> list[dict]:
                 "stars": stars,
                 "availability_remains": _to_int_or_none(avail),
             })
-        return result
+        return new_hash, result
 
     return await _retry(_call)
 
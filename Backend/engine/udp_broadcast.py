@@ -1,53 +1,381 @@
 import asyncio
+import ipaddress
 import logging
+import random
 import socket
+import time
 
-from .protocol import create_message
+from .address_book import AddressBook, Frontend
+from .metrics import DELIVERIES, FANOUT_SECONDS, RETRANSMITS, SEND_FAILURES
+from .protocol import (
+    FORMAT_JSON, FORMATS, encode_gift_payloads, encode_payload, key_id, negotiated_format,
+    parse_message, sign_with_key,
+)
+from .stream_hub import StreamHub
 
 logger = logging.getLogger(__name__)
 
+SEND_BUFFER_SIZE = 4 * 1024 * 1024  # room for a whole fan-out burst
+DNS_TTL = 300.0  # seconds between background re-resolutions
+RETRANSMIT_TIMEOUT = 0.15  # seconds before the first retransmit; grows linearly
+MAX_ATTEMPTS = 4  # total sends of one new_gifts datagram, including the first
+PROBE_INTERVAL = 30.0  # seconds between pings to frontends that have not ACKed yet
+
+
+def _is_ip_literal(host: str) -> bool:
+    try:
+        ipaddress.ip_address(host)
+        return True
+    except ValueError:
+        return False
+
+
+class _Pending:
+    __slots__ = ("license_key", "addr", "msg", "attempts", "timer")
+
+    def __init__(self, license_key: str, addr: tuple, msg: bytes):
+        self.license_key = license_key
+        self.addr = addr
+        self.msg = msg
+        self.attempts = 1
+        self.timer: asyncio.TimerHandle | None = None
+
 
 class UdpBroadcaster:
-    def __init__(self):
+    """Signs and fans out ``new_gifts`` datagrams to every frontend.
+
+    Each broadcast carries a sequence number. Frontends that have proven they
+    acknowledge (by answering a ``ping`` probe or an earlier broadcast) get
+    retransmits until they ACK or ``MAX_ATTEMPTS`` is reached; older
+    frontends stay fire-and-forget so they never see duplicates.
+    """
+
+    def __init__(
+        self,
+        address_book: AddressBook | None = None,
+        stream_hub: StreamHub | None = None,
+    ):
+        self._address_book = address_book
+        self._stream_hub = stream_hub
         self._sock: socket.socket | None = None
+        self._refresh_task: asyncio.Task | None = None
+        self._probe_task: asyncio.Task | None = None
+        self._dns: dict[str, str] = {}  # hostname -> IPv4 address
+        self._failed_hosts: set[str] = set()
+        self._inflight: dict[str, asyncio.Task] = {}
+        # license_key -> seconds from broadcast start until its datagram was sent
+        self.send_latency: dict[str, float] = {}
+        self.send_failures: dict[str, int] = {}
+        self.last_fanout_duration = 0.0
+        # Reliability: seeded from the clock so a restart never reuses sequence numbers
+        self._seq = int(time.time() * 1000)
+        self._pending: dict[tuple[tuple, int], _Pending] = {}
+        self._addr_index: dict[tuple, str] = {}  # resolved (ip, port) -> license_key
+        self._ack_capable: set[str] = set()
+        self._formats: dict[str, int] = {}  # wire format each frontend advertised in its ACKs
+        self.delivered = 0
+        self.expired = 0
+        self.retransmits = 0
 
     def start(self):
         self._sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
         self._sock.setblocking(False)
-        logger.info("UDP broadcaster started")
+        try:
+            self._sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, SEND_BUFFER_SIZE)
+        except OSError as e:
+            logger.warning("Could not raise UDP send buffer: %s", e)
+        self._sock.bind(("0.0.0.0", 0))
+        loop = asyncio.get_running_loop()
+        loop.add_reader(self._sock.fileno(), self._on_readable)
+        self._refresh_task = asyncio.create_task(self._refresh_loop())
+        if self._address_book is not None:
+            self._probe_task = asyncio.create_task(self._probe_loop())
+        logger.info("UDP broadcaster started on port %d", self._sock.getsockname()[1])
 
     def stop(self):
+        for task in (self._refresh_task, self._probe_task):
+            if task:
+                task.cancel()
+        self._refresh_task = self._probe_task = None
+        for p in self._pending.values():
+            if p.timer:
+                p.timer.cancel()
+        self._pending.clear()
         if self._sock:
+            asyncio.get_event_loop().remove_reader(self._sock.fileno())
             self._sock.close()
             self._sock = None
         logger.info("UDP broadcaster stopped")
 
+    @property
+    def unresolvable(self) -> set[str]:
+        """License keys whose host has never resolved to an address."""
+        if self._address_book is None or not self._failed_hosts:
+            return set()
+        return {
+            fe.license_key for fe in self._address_book.frontends()
+            if fe.addr[0] in self._failed_hosts
+        }
+
+    @property
+    def delivery_ratio(self) -> float:
+        done = self.delivered + self.expired
+        return self.delivered / done if done else 1.0
+
+    async def probe(self, frontends: list[Frontend]):
+        """Send a ``ping`` so frontends that ACK get reliable delivery."""
+        for fe in frontends:
+            ip = await self.resolve(fe.addr[0])
+            if ip is None:
+                continue
+            addr = (ip, fe.addr[1])
+            self._addr_index[addr] = fe.license_key
+            msg = sign_with_key(fe.key, encode_payload("ping", seq=self._next_seq()))
+            try:
+                self._sock.sendto(msg, addr)
+            except OSError as e:
+                logger.debug("Probe to %s:%d failed: %s", addr[0], addr[1], e)
+
+    def forget(self, license_key: str):
+        """Drop what the frontend negotiated: its format, its ACK capability
+        and any datagrams still waiting for an ACK.
+
+        Called when a license is registered again, moves or is deleted; the
+        frontend behind it may be a different build, so it starts over as
+        fire-and-forget JSON until it answers a probe.
+        """
+        self._ack_capable.discard(license_key)
+        self._formats.pop(license_key, None)
+        for key in [k for k, p in self._pending.items() if p.license_key == license_key]:
+            self._pending.pop(key).timer.cancel()
+        for addr in [a for a, k in self._addr_index.items() if k == license_key]:
+            del self._addr_index[addr]
+
+    async def warm(self, frontends: list[Frontend]):
+        """Resolve every frontend host ahead of the first broadcast."""
+        hosts = {fe.addr[0] for fe in frontends}
+        await asyncio.gather(*(self.resolve(h) for h in hosts))
+
+    async def resolve(self, host: str) -> str | None:
+        """Resolve ``host`` once, sharing the lookup between concurrent callers."""
+        if _is_ip_literal(host):
+            self._dns[host] = host
+            return host
+        task = self._inflight.get(host)
+        if task is None:
+            task = asyncio.ensure_future(self._getaddrinfo(host))
+            self._inflight[host] = task
+            task.add_done_callback(lambda _: self._inflight.pop(host, None))
+        return await task
+
+    async def _getaddrinfo(self, host: str) -> str | None:
+        loop = asyncio.get_running_loop()
+        try:
+            infos = await loop.getaddrinfo(host, None, family=socket.AF_INET, type=socket.SOCK_DGRAM)
+            ip = infos[0][4][0]
+        except (OSError, ValueError, IndexError) as e:
+            # ValueError covers UnicodeError from malformed names such as "a..b"
+            logger.warning("Could not resolve %s: %s", host, e)
+            # Keep a stale address if we had one; it beats dropping the frontend
+            if host not in self._dns:
+                self._failed_hosts.add(host)
+            return self._dns.get(host)
+        self._dns[host] = ip
+        self._failed_hosts.discard(host)
+        return ip
+
+    async def _refresh_loop(self):
+        while True:
+            await asyncio.sleep(DNS_TTL)
+            if self._address_book is not None:
+                self._forget_unused_hosts()
+            hosts = [h for h, ip in self._dns.items() if h != ip]
+            hosts.extend(self._failed_hosts)
+            await asyncio.gather(*(self.resolve(h) for h in hosts))
+
+    def _forget_unused_hosts(self):
+        live = {fe.addr[0] for fe in self._address_book.frontends()}
+        for host in [h for h in self._dns if h not in live]:
+            del self._dns[host]
+        self._failed_hosts &= live
+
     async def broadcast_gifts(
         self,
-        frontends: list[dict],
+        frontends: list[Frontend],
         gifts: list[dict],
+        trace: dict | None = None,
     ):
-        """Send new_gifts message to all registered frontends."""
-        if not frontends or not gifts:
+        """Send new_gifts message to all registered frontends.
+
+        All datagrams are signed up front and pushed to the kernel in a single
+        pass without yielding to the event loop; only sends that hit a full
+        socket buffer or a not-yet-resolved host are finished concurrently
+        afterwards. The batch is shuffled so no frontend is always served last.
+        Frontends connected to the stream hub get the same payload over their
+        WebSocket instead of UDP.
+
+        The gift list is encoded once per wire format; formats that carry part
+        numbers are split so every datagram stays under ``MAX_DATAGRAM``, and
+        each datagram has its own seq.
+        ``trace`` is stamped with the fan-out start as ``sent`` and carried to
+        every frontend whose format supports it.
+        """
+        if not gifts:
             return
 
-        loop = asyncio.get_event_loop()
+        if trace is not None:
+            trace["sent"] = time.time()
+        # Serialize once per format; only the per-key HMAC differs between frontends
+        payloads = {
+            fmt: encode_gift_payloads(gifts, fmt, self._next_seq, trace)
+            for fmt in FORMATS
+        }
 
-        for fe in frontends:
-            host = fe.get("udp_host")
-            port = fe.get("udp_port")
-            license_key = fe.get("license_key")
-            if not host or not port or not license_key:
-                continue
+        hub = self._stream_hub
+        stream_task = asyncio.ensure_future(hub.push(payloads)) if hub else None
+
+        order = [fe for fe in frontends if not (hub and hub.is_connected(fe.license_key))]
+        random.shuffle(order)
+        formats = self._formats
+        json_payloads = payloads[FORMAT_JSON]
+        batch = [
+            (fe.license_key, fe.addr, seq, sign_with_key(fe.key, payload))
+            for fe in order
+            for seq, payload in payloads.get(formats.get(fe.license_key), json_payloads)
+        ]
 
+        started = time.perf_counter()
+        deferred = []
+        for license_key, addr, seq, msg in batch:
+            ip = self._dns.get(addr[0])
+            if ip is None:
+                deferred.append((license_key, addr, seq, msg))
+                continue
             try:
-                msg = create_message(license_key, "new_gifts", {"gifts": gifts})
-                await loop.sock_sendto(self._sock, msg, (host, port))
-                logger.debug(
-                    "Sent %d gifts to %s:%d (key=%s...)",
-                    len(gifts), host, port, license_key[:8],
-                )
+                self._sock.sendto(msg, (ip, addr[1]))
+            except BlockingIOError:
+                deferred.append((license_key, addr, seq, msg))
+                continue
             except Exception as e:
-                logger.warning(
-                    "Failed to send to %s:%d: %s", host, port, e
-                )
+                self._send_failed(license_key, addr, e)
+                continue
+            self.send_latency[license_key] = time.perf_counter() - started
+            self._track(seq, license_key, (ip, addr[1]), msg)
+
+        if deferred:
+            loop = asyncio.get_running_loop()
+            await asyncio.gather(*(
+                self._send_deferred(loop, started, *item) for item in deferred
+            ))
+
+        if stream_task is not None:
+            await stream_task
+
+        self.last_fanout_duration = time.perf_counter() - started
+        FANOUT_SECONDS.observe(self.last_fanout_duration)
+        logger.debug(
+            "Sent %d gifts to %d frontends (%d datagrams) in %.2fms (%d deferred)",
+            len(gifts), len(order), len(batch), self.last_fanout_duration * 1000, len(deferred),
+        )
+
+    async def _send_deferred(
+        self, loop, started: float, license_key: str, addr: tuple, seq: int, msg: bytes,
+    ):
+        host, port = addr
+        ip = self._dns.get(host)
+        if ip is None:
+            # Known-bad hosts are left to the refresh loop so they can't stall the fan-out
+            if host not in self._failed_hosts:
+                ip = await self.resolve(host)
+            if ip is None:
+                self._send_failed(license_key, addr, OSError("host not resolved"))
+                return
+        try:
+            await loop.sock_sendto(self._sock, msg, (ip, port))
+        except Exception as e:
+            self._send_failed(license_key, addr, e)
+            return
+        self.send_latency[license_key] = time.perf_counter() - started
+        self._track(seq, license_key, (ip, port), msg)
+
+    def _send_failed(self, license_key: str, addr: tuple, err: Exception):
+        self.send_failures[license_key] = self.send_failures.get(license_key, 0) + 1
+        SEND_FAILURES.inc(key_id(license_key))
+        logger.warning("Failed to send to %s:%d: %s", addr[0], addr[1], err)
+
+    # ── reliability ──
+
+    def _next_seq(self) -> int:
+        self._seq += 1
+        return self._seq
+
+    def _track(self, seq: int, license_key: str, addr: tuple, msg: bytes):
+        self._addr_index[addr] = license_key
+        if license_key not in self._ack_capable:
+            return
+        p = _Pending(license_key, addr, msg)
+        p.timer = asyncio.get_running_loop().call_later(
+            RETRANSMIT_TIMEOUT, self._retransmit, (addr, seq),
+        )
+        self._pending[(addr, seq)] = p
+
+    async def _probe_loop(self):
+        # Frontends usually start after their address is registered, so the
+        # first probe is often lost; keep pinging until they answer
+        while True:
+            await asyncio.sleep(PROBE_INTERVAL)
+            silent = [
+                fe for fe in self._address_book.frontends()
+                if fe.license_key not in self._ack_capable
+            ]
+            if silent:
+                await self.probe(silent)
+
+    def _retransmit(self, key: tuple):
+        p = self._pending.get(key)
+        if p is None:
+            return
+        if p.attempts >= MAX_ATTEMPTS:
+            del self._pending[key]
+            self.expired += 1
+            DELIVERIES.inc("expired")
+            logger.warning(
+                "No ACK from %s:%d after %d attempts", p.addr[0], p.addr[1], p.attempts,
+            )
+            return
+        p.attempts += 1
+        self.retransmits += 1
+        RETRANSMITS.inc()
+        try:
+            self._sock.sendto(p.msg, p.addr)
+        except OSError as e:
+            logger.debug("Retransmit to %s:%d failed: %s", p.addr[0], p.addr[1], e)
+        p.timer = asyncio.get_running_loop().call_later(
+            RETRANSMIT_TIMEOUT * p.attempts, self._retransmit, key,
+        )
+
+    def _on_readable(self):
+        while True:
+            try:
+                data, addr = self._sock.recvfrom(2048)
+            except (BlockingIOError, InterruptedError):
+                return
+            except OSError as e:
+                logger.debug("UDP receive error: %s", e)
+                return
+            license_key = self._addr_index.get(addr)
+            if license_key is None:
+                continue
+            msg = parse_message(license_key, data)
+            if msg is None or msg.get("a") != "ack":
+                continue
+            data = msg.get("d")
+            if not isinstance(data, dict):
+                continue
+            self._ack_capable.add(license_key)
+            self._formats[license_key] = negotiated_format(data.get("fmt", FORMAT_JSON))
+            p = self._pending.pop((addr, data.get("s")), None)
+            if p is not None:
+                p.timer.cancel()
+                self.delivered += 1
+                DELIVERIES.inc("delivered")
@@ -3,15 +3,22 @@ import logging
 from aiohttp import web
 
 from config import (
-    HOST, PORT, SERVER_API_ID, SERVER_API_HASH, SERVER_SESSION_STRING,
+    HOST, PORT, SERVER_API_ID, SERVER_API_HASH, SERVER_SESSION_STRINGS,
     LICENSE_SERVER_URL, INTERNAL_API_SECRET, DB_PATH, SCAN_INTERVAL,
+    SCAN_BURST_INTERVAL, SCAN_BURST_WINDOW, LOOP_MONITOR, LOOP_SLOW_THRESHOLD,
 )
 from db.database import Database
+from engine import metrics
+from engine.address_book import AddressBook
 from engine.gift_scanner import GiftScanner
+from engine.loop_monitor import LoopMonitor
+from engine.stream_hub import StreamHub
 from engine.udp_broadcast import UdpBroadcaster
 from license.license_client import LicenseClient
 from api.middleware import auth_middleware
 from api.internal_routes import setup_internal_routes
+from api.metrics_routes import setup_metrics_routes
+from api.stream_routes import setup_stream_routes
 
 logging.basicConfig(
     format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
@@ -21,11 +28,26 @@ logger = logging.getLogger(__name__)
 
 
 async def on_startup(app: web.Application):
+    if LOOP_MONITOR:
+        # First, so stalls during the rest of startup are caught too
+        app["loop_monitor"] = LoopMonitor(
+            "backend", threshold=LOOP_SLOW_THRESHOLD, on_lag=metrics.LOOP_LAG_SECONDS.observe,
+        )
+        app["loop_monitor"].start()
+
     db = Database(DB_PATH)
     await db.connect()
 
-    broadcaster = UdpBroadcaster()
+    address_book = AddressBook(db)
+    await address_book.load()
+
+    stream_hub = StreamHub(db)
+    await stream_hub.load()
+
+    broadcaster = UdpBroadcaster(address_book, stream_hub)
     broadcaster.start()
+    await broadcaster.warm(address_book.frontends())
+    await broadcaster.probe(address_book.frontends())
 
     license_client = LicenseClient(LICENSE_SERVER_URL)
     await license_client.start()
@@ -33,14 +55,19 @@ async def on_startup(app: web.Application):
     scanner = GiftScanner(
         db=db,
         broadcaster=broadcaster,
+        address_book=address_book,
         api_id=SERVER_API_ID,
         api_hash=SERVER_API_HASH,
-        session_string=SERVER_SESSION_STRING,
+        session_strings=SERVER_SESSION_STRINGS,
         scan_interval=SCAN_INTERVAL,
+        burst_interval=SCAN_BURST_INTERVAL,
+        burst_window=SCAN_BURST_WINDOW,
     )
     await scanner.start()
 
     app["db"] = db
+    app["address_book"] = address_book
+    app["stream_hub"] = stream_hub
     app["broadcaster"] = broadcaster
     app["license_client"] = license_client
     app["scanner"] = scanner
@@ -49,11 +76,17 @@ async def on_startup(app: web.Application):
     logger.info("Backend started on %s:%d", HOST, PORT)
 
 
+async def on_shutdown(app: web.Application):
+    await app["stream_hub"].close()
+
+
 async def on_cleanup(app: web.Application):
     await app["scanner"].stop()
     app["broadcaster"].stop()
     await app["license_client"].stop()
     await app["db"].close()
+    if "loop_monitor" in app:
+        app["loop_monitor"].stop()
     logger.info("Backend stopped")
 
 
@@ -61,8 +94,11 @@ def create_app() -> web.Application:
     app = web.Application(middlewares=[auth_middleware])
 
     setup_internal_routes(app)
+    setup_stream_routes(app)
+    setup_metrics_routes(app)
 
     app.on_startup.append(on_startup)
+    app.on_shutdown.append(on_shutdown)
     app.on_cleanup.append(on_cleanup)
 
     return app
@@ -19,6 +19,8 @@ from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
 from dotenv import load_dotenv
 
+from loop_monitor import LoopMonitor
+
 load_dotenv()
 
 # Настройка логирования
@@ -52,6 +54,9 @@ WEB_AUTH_HOST = os.getenv("WEB_AUTH_HOST", "http://localhost:8082")
 WEB_AUTH_PORT = int(os.getenv("WEB_AUTH_PORT", "8082"))
 BACKEND_URL = os.getenv("BACKEND_URL", "http://localhost:8090")
 INTERNAL_API_SECRET = os.getenv("INTERNAL_API_SECRET", "")
+# Event loop lag probe and stall watchdog; logs the stack of callbacks that block the loop
+LOOP_MONITOR = os.getenv("LOOP_MONITOR", "0") == "1"
+LOOP_SLOW_THRESHOLD = float(os.getenv("LOOP_SLOW_THRESHOLD", "0.1"))
 
 
 async def _backend_request(method: str, path: str, json_data: dict | None = None) -> dict | None:
@@ -3297,6 +3302,9 @@ async def admin_msg_handler(message: Message, state: FSMContext):
 
 async def main():
     logger.info("Бот запускается...")
+    monitor = LoopMonitor("service_bot", threshold=LOOP_SLOW_THRESHOLD) if LOOP_MONITOR else None
+    if monitor:
+        monitor.start()
 
     from web_auth import create_web_app, start_web_server, cleanup_expired_sessions
     web_app = create_web_app(db, bot, SERVER_API_ID, SERVER_API_HASH,
@@ -3317,6 +3325,8 @@ async def main():
         await dp.start_polling(bot)
     finally:
         await runner.cleanup()
+        if monitor:
+            monitor.stop()
 
 if __name__ == "__main__":
     asyncio.run(main())
\ No newline at end of file
@@ -0,0 +1,80 @@
+import asyncio
+import logging
+
+from telethon import TelegramClient, events
+
+from .telegram_api import extract_balance, fetch_stars_balance
+from .tl_compat import tl
+
+logger = logging.getLogger(__name__)
+
+RECONCILE_INTERVAL = 60.0  # seconds between background balance checks
+
+
+class BalanceTracker:
+    """Locally tracked star balance, so purchases never wait on GetStarsStatus.
+
+    Seeded on start, debited optimistically after each successful purchase,
+    overwritten by ``updateStarsBalance`` pushes from Telegram and reconciled
+    with the server on a timer or on request (e.g. after a failed purchase).
+    """
+
+    def __init__(self, client: TelegramClient, interval: float = RECONCILE_INTERVAL):
+        self._client = client
+        self._interval = interval
+        self._task: asyncio.Task | None = None
+        self._wake = asyncio.Event()
+        self._debits = 0  # bumped on every debit; a refresh that overlapped one is stale
+        self.balance: int | None = None
+
+    async def start(self):
+        await self.refresh()
+        self._client.add_event_handler(self._on_update, events.Raw(tl("UpdateStarsBalance")))
+        self._task = asyncio.create_task(self._loop())
+        logger.info("Balance tracker started (balance=%s)", self.balance)
+
+    def stop(self):
+        if self._task:
+            self._task.cancel()
+            self._task = None
+        self._client.remove_event_handler(self._on_update)
+
+    async def get(self) -> int:
+        if self.balance is None:
+            await self.refresh()
+        return self.balance or 0
+
+    def debit(self, stars: int):
+        if self.balance is not None:
+            self.balance -= stars
+        self._debits += 1
+
+    def reconcile_soon(self):
+        self._wake.set()
+
+    async def refresh(self):
+        debits = self._debits
+        try:
+            balance = await fetch_stars_balance(self._client)
+        except Exception as e:
+            logger.warning("Balance refresh failed: %s", e)
+            return
+        if debits != self._debits:
+            # A purchase finished while we were asking; the answer may predate it
+            self.reconcile_soon()
+            return
+        if self.balance is not None and balance != self.balance:
+            logger.info("Balance reconciled: %d -> %d", self.balance, balance)
+        self.balance = balance
+
+    async def _loop(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), self._interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            await self.refresh()
+
+    async def _on_update(self, update):
+        self.balance = extract_balance(update)
@@ -0,0 +1,179 @@
+import asyncio
+import logging
+import random
+import time
+
+from telethon import TelegramClient
+
+from .tl_compat import tl
+
+logger = logging.getLogger(__name__)
+
+KEEPALIVE_INTERVAL = 10.0  # seconds between pings on an otherwise idle connection
+PING_TIMEOUT = 3.0  # a ping slower than this marks the connection down
+CONNECT_TIMEOUT = 10.0
+RECONNECT_MIN = 0.2  # first retry delay after a failed reconnect; doubled per failure
+RECONNECT_MAX = 10.0
+
+
+class _Link:
+    """One MTProto connection and what the supervisor knows about it."""
+
+    def __init__(self, name: str, client: TelegramClient):
+        self.name = name
+        self.client = client
+        self.ready = False
+        self.rtt: float | None = None
+        self.wake = asyncio.Event()
+        self.task: asyncio.Task | None = None
+
+
+class ConnectionSupervisor:
+    """Keeps GiftBuyer's MTProto connections alive and tracks which is usable.
+
+    Every connection gets a task that pings it each ``keepalive`` seconds and,
+    when a ping fails or times out, drops the socket and reconnects with
+    exponential backoff instead of waiting out Telethon's own retries. An
+    optional standby is a second, already authorized connection that serves
+    purchases while the primary is down. ``ready`` and ``client`` are plain
+    reads, so the gift path checks them without awaiting anything.
+    """
+
+    def __init__(
+        self,
+        primary: TelegramClient,
+        standby: TelegramClient | None = None,
+        keepalive: float = KEEPALIVE_INTERVAL,
+        ping_timeout: float = PING_TIMEOUT,
+    ):
+        self._links = [_Link("primary", primary)]
+        if standby is not None:
+            self._links.append(_Link("standby", standby))
+        self._keepalive = keepalive
+        self._ping_timeout = ping_timeout
+        self._up = asyncio.Event()  # set whenever a link becomes ready
+        self._closed = False
+
+    async def start(self):
+        """Connect every link. The primary must come up; a standby that fails
+        is retried in the background."""
+        for link in self._links:
+            try:
+                await asyncio.wait_for(link.client.connect(), CONNECT_TIMEOUT)
+            except Exception as e:
+                if link is self._links[0]:
+                    raise
+                logger.warning("MTProto %s connection failed: %s", link.name, e)
+                link.wake.set()
+            else:
+                link.ready = True
+            link.task = asyncio.create_task(self._supervise(link))
+        names = ", ".join(link.name for link in self._links)
+        logger.info("Connection supervisor started: %s", names)
+
+    async def stop(self):
+        self._closed = True
+        tasks = [link.task for link in self._links if link.task]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        for link in self._links:
+            link.task = None
+            link.ready = False
+            try:
+                await link.client.disconnect()
+            except Exception:
+                pass
+
+    @property
+    def primary(self) -> TelegramClient:
+        return self._links[0].client
+
+    @property
+    def ready(self) -> bool:
+        return any(link.ready for link in self._links)
+
+    @property
+    def client(self) -> TelegramClient | None:
+        """First ready connection, primary preferred; None while all are down."""
+        for link in self._links:
+            if link.ready:
+                return link.client
+        return None
+
+    async def wait_ready(self, timeout: float) -> TelegramClient | None:
+        """A ready client, reconnecting right away if none is; None after ``timeout``."""
+        if self.client is None:
+            self.kick()
+            try:
+                await asyncio.wait_for(self._until_ready(), timeout)
+            except asyncio.TimeoutError:
+                pass
+        return self.client
+
+    def kick(self):
+        """Check every link now instead of at its next keepalive."""
+        for link in self._links:
+            link.wake.set()
+
+    def failed(self, client: TelegramClient):
+        """A request on ``client`` hit a connection error; route around it until
+        its supervisor has it back."""
+        for link in self._links:
+            if link.client is client and link.ready:
+                link.ready = False
+                logger.warning("MTProto %s connection failed a request, rechecking", link.name)
+                link.wake.set()
+
+    def stats(self) -> dict:
+        return {
+            link.name: {
+                "ready": link.ready,
+                "rtt_ms": round(link.rtt * 1000, 1) if link.rtt is not None else None,
+            }
+            for link in self._links
+        }
+
+    async def _until_ready(self):
+        while self.client is None:
+            self._up.clear()
+            await self._up.wait()
+
+    async def _supervise(self, link: _Link):
+        while not self._closed:
+            try:
+                await asyncio.wait_for(link.wake.wait(), self._keepalive)
+            except asyncio.TimeoutError:
+                pass
+            link.wake.clear()
+            delay = RECONNECT_MIN
+            while not self._closed and not await self._check(link):
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, RECONNECT_MAX)
+
+    async def _check(self, link: _Link) -> bool:
+        """Reconnect ``link`` if needed and ping it; True once it answers."""
+        client = link.client
+        try:
+            if not client.is_connected():
+                await asyncio.wait_for(client.connect(), CONNECT_TIMEOUT)
+            start = time.monotonic()
+            ping = tl("PingRequest")(ping_id=random.getrandbits(63))
+            await asyncio.wait_for(client(ping), self._ping_timeout)
+            link.rtt = time.monotonic() - start
+        except Exception as e:
+            if link.ready:
+                reason = str(e) or type(e).__name__
+                logger.warning("MTProto %s connection lost: %s", link.name, reason)
+            link.ready = False
+            # A silent socket still looks connected; drop it so the retry starts clean
+            try:
+                await client.disconnect()
+            except Exception:
+                pass
+            return False
+        if not link.ready and not self._closed:
+            link.ready = True
+            self._up.set()
+            logger.info("MTProto %s connection ready (ping %.0f ms)", link.name, link.rtt * 1000)
+        return True
@@ -1,4 +1,5 @@
 import re
+from bisect import bisect_left
 from dataclasses import dataclass
 
 INF = float("inf")
@@ -57,6 +58,54 @@ def parse_distribution(distribution: str) -> list[PurchaseRule]:
     return rules
 
 
+class RuleIndex:
+    """Distribution rules compiled for O(log R) lookup by star price.
+
+    Every rule boundary splits the price axis into alternating segments:
+    the boundary points themselves and the open gaps between them. The set
+    of matching rules is constant on each segment, so it is computed once
+    per segment here and a lookup is a single bisect.
+    """
+
+    def __init__(self, rules: list[PurchaseRule]):
+        self.rules = rules
+        self.counts = [r.count for r in rules]
+        self.labels = [f"{r.min}-{r.max}" for r in rules]
+        self._bounds = sorted({r.min for r in rules} | {r.max for r in rules})
+        # Slot 2*i is the gap below bounds[i], slot 2*i+1 is bounds[i] itself
+        self._slots: list[tuple[int, ...]] = []
+        for i in range(len(self._bounds) + 1):
+            self._slots.append(self._scan(self._gap_point(i)))
+            if i < len(self._bounds):
+                self._slots.append(self._scan(self._bounds[i]))
+
+    def __len__(self) -> int:
+        return len(self.rules)
+
+    def match(self, price: float) -> tuple[int, ...]:
+        """Indices of the rules whose range contains ``price``."""
+        i = bisect_left(self._bounds, price)
+        if i < len(self._bounds) and self._bounds[i] == price:
+            return self._slots[2 * i + 1]
+        return self._slots[2 * i]
+
+    def _gap_point(self, i: int) -> float:
+        lo = self._bounds[i - 1] if i > 0 else -INF
+        hi = self._bounds[i] if i < len(self._bounds) else INF
+        if lo == -INF:
+            return hi - 1 if hi != INF else 0.0
+        if hi == INF:
+            return lo + 1
+        return (lo + hi) / 2
+
+    def _scan(self, price: float) -> tuple[int, ...]:
+        return tuple(i for i, r in enumerate(self.rules) if r.min <= price <= r.max)
+
+
+def compile_distribution(distribution: str) -> RuleIndex:
+    return RuleIndex(parse_distribution(distribution))
+
+
 def validate_distribution(text: str) -> tuple[bool, str]:
     lines = text.strip().split("\n")
     if not lines:
@@ -0,0 +1,33 @@
+from datetime import datetime
+
+# (name, from stamp, to stamp); Backend stamps prev/poll/seen/sent, the
+# listener recv/parsed and GiftBuyer the rest. Backend and frontend clocks
+# differ, so "network" also absorbs any skew between the two hosts.
+TRACE_SEGMENTS = (
+    ("polling", "prev", "poll"),  # upper bound on how long the drop sat unseen
+    ("rpc", "poll", "seen"),
+    ("scanner", "seen", "sent"),
+    ("network", "sent", "recv"),
+    ("parse", "recv", "parsed"),
+    ("queue", "parsed", "dispatched"),
+    ("plan", "dispatched", "planned"),
+    ("payment", "planned", "paid"),
+)
+
+
+def trace_record(trace: dict, gifts: int) -> dict:
+    """One line of the drop trace log: per-stage milliseconds plus raw stamps."""
+    def span(start: str, end: str) -> float | None:
+        if trace.get(start) and trace.get(end):
+            return round((trace[end] - trace[start]) * 1000, 2)
+        return None
+
+    return {
+        "id": trace.get("id"),
+        "at": datetime.fromtimestamp(trace.get("seen") or trace["dispatched"]).isoformat(),
+        "gifts": gifts,
+        "bought": trace.get("bought", 0),
+        "ms": {name: span(start, end) for name, start, end in TRACE_SEGMENTS},
+        "total_ms": span("seen", "paid"),
+        "stamps": {k: v for k, v in trace.items() if isinstance(v, float)},
+    }
@@ -1,18 +1,60 @@
 import asyncio
 import json
 import logging
-import os
-from datetime import datetime
+import time
+from collections import OrderedDict
 from pathlib import Path
 
 from telethon import TelegramClient
+from telethon.errors import FloodWaitError
 from telethon.sessions import StringSession
 
-from .distribution import parse_distribution, PurchaseRule
-from .telegram_api import get_stars_balance, pay_star_gift
+from .balance_tracker import BalanceTracker
+from .connection import ConnectionSupervisor
+from .distribution import RuleIndex, compile_distribution
+from .drop_trace import trace_record
+from .planner import OBJECTIVE_SLOTS, OBJECTIVES, Slot, plan_purchases
+from .purchase_log import PurchaseLog
+from .status_store import StatusStore
+from .telegram_api import PaymentFormCache, pay_star_gift, prefetch_payment_form
 
 logger = logging.getLogger(__name__)
 
+MAX_FLOOD_WAIT = 30  # seconds; longer waits outlast a drop, so the purchase is dropped
+FLOOD_RETRIES = 3
+MAX_PURCHASE_GAP = 2.0
+PREFETCH_TOP = 5  # distinct gifts whose payment forms are warmed per notification
+READY_GRACE = 2.0  # seconds a drop waits for a reconnect before its gifts are skipped
+DROP_MEMORY = 32  # multi-part drops whose per-rule purchases are remembered across parts
+
+
+class _Pacer:
+    """Spaces purchase RPCs apart, widening the gap on FLOOD_WAIT.
+
+    With no flood errors the gap is zero and purchases go out as fast as
+    the concurrency limit allows.
+    """
+
+    def __init__(self):
+        self._gap = 0.0
+        self._next = 0.0
+
+    async def wait(self):
+        loop = asyncio.get_running_loop()
+        now = loop.time()
+        start = max(now, self._next)
+        # Claim the slot before sleeping so concurrent callers queue behind it
+        self._next = start + self._gap
+        if start > now:
+            await asyncio.sleep(start - now)
+
+    def flood(self, seconds: float):
+        self._gap = min(MAX_PURCHASE_GAP, max(self._gap * 2, 0.05))
+        self._next = max(self._next, asyncio.get_running_loop().time() + seconds)
+
+    def ok(self):
+        self._gap = self._gap / 2 if self._gap > 0.01 else 0.0
+
 
 class GiftBuyer:
     """Receives new gift notifications and purchases based on distribution rules."""
@@ -22,153 +64,273 @@ class GiftBuyer:
         api_id: int,
         api_hash: str,
         session_string: str,
-        status_file: str,
+        status: StatusStore,
         log_file: str,
+        concurrency: int = 3,
+        objective: str = OBJECTIVE_SLOTS,
+        trace_file: str | None = None,
+        standby_session: str | None = None,
     ):
+        if objective not in OBJECTIVES:
+            raise ValueError(f"Unknown purchase objective {objective!r}")
         self._api_id = api_id
         self._api_hash = api_hash
         self._session_string = session_string
-        self._status_file = status_file
-        self._log_file = log_file
-        self._client: TelegramClient | None = None
+        self._standby_session = standby_session
+        self._status = status
+        self._log = PurchaseLog(log_file)
+        self._trace_log = PurchaseLog(trace_file, timestamps=False) if trace_file else None
+        self._conn: ConnectionSupervisor | None = None
         self._peer = None
         self._lock = asyncio.Lock()
+        self._concurrency = max(1, concurrency)
+        self._objective = objective
+        self._pacer = _Pacer()
+        self._forms = PaymentFormCache()
+        self._balance: BalanceTracker | None = None
+        self._index: RuleIndex | None = None
+        self._index_source: str | None = None
+        # drop id -> (rule index, units bought per rule, parts seen)
+        self._drops: OrderedDict[str, tuple[RuleIndex, list[int], set[int]]] = OrderedDict()
+        # Compile the distribution as soon as it is saved, not on the next drop
+        status.subscribe(lambda data: self._rule_index(data.get("distribution", "")))
 
-    async def connect(self):
-        self._client = TelegramClient(
-            StringSession(self._session_string),
+    def _new_client(self, session_string: str, receive_updates: bool = True) -> TelegramClient:
+        return TelegramClient(
+            StringSession(session_string),
             self._api_id,
             self._api_hash,
             connection_retries=5,
+            flood_sleep_threshold=0,
+            receive_updates=receive_updates,
         )
-        await self._client.connect()
-        me = await self._client.get_me()
-        self._peer = await self._client.get_input_entity(me)
+
+    async def connect(self):
+        standby = None
+        if self._standby_session:
+            # Only the primary takes updates; the standby exists to send purchases
+            standby = self._new_client(self._standby_session, receive_updates=False)
+        self._conn = ConnectionSupervisor(self._new_client(self._session_string), standby)
+        await self._conn.start()
+        client = self._conn.primary
+        me = await client.get_me()
+        self._peer = await client.get_input_entity(me)
+        self._balance = BalanceTracker(client)
+        await self._balance.start()
+        self._log.start()
+        if self._trace_log:
+            self._trace_log.start()
         logger.info("GiftBuyer Telethon client connected")
 
     async def disconnect(self):
-        if self._client:
-            try:
-                await self._client.disconnect()
-            except Exception:
-                pass
-            self._client = None
+        if self._balance:
+            self._balance.stop()
+            self._balance = None
+        if self._conn:
+            await self._conn.stop()
+            self._conn = None
+        await self._log.close()
+        if self._trace_log:
+            await self._trace_log.close()
         logger.info("GiftBuyer disconnected")
 
+    async def get_balance(self) -> int:
+        """Tracked star balance; no RPC unless it has never been fetched."""
+        if not self._balance:
+            return 0
+        return await self._balance.get()
+
+    @property
+    def ready(self) -> bool:
+        """Whether a purchase could be sent right now; never blocks."""
+        return self._conn is not None and self._conn.ready
+
     def read_status(self) -> dict:
-        try:
-            with open(self._status_file, "r") as f:
-                return json.load(f)
-        except (FileNotFoundError, json.JSONDecodeError):
-            return {}
+        return self._status.get()
 
     def write_status(self, data: dict):
-        os.makedirs(os.path.dirname(self._status_file), exist_ok=True)
-        tmp = self._status_file + ".tmp"
-        with open(tmp, "w") as f:
-            json.dump(data, f, indent=2, ensure_ascii=False)
-        os.replace(tmp, self._status_file)
+        self._status.set(data)
 
     def _append_log(self, line: str):
-        os.makedirs(os.path.dirname(self._log_file), exist_ok=True)
-        with open(self._log_file, "a") as f:
-            f.write(f"[{datetime.now().isoformat()}] {line}\n")
+        self._log.write(line)
 
-    async def handle_new_gifts(self, gifts: list[dict]):
-        """Called by UDP listener when Backend broadcasts new gifts."""
+    async def handle_new_gifts(
+        self, gifts: list[dict], trace: dict | None = None, drop: dict | None = None,
+    ):
+        """Called by the gift feed when Backend broadcasts new gifts.
+
+        ``trace`` carries the drop's stage timestamps so far; the rest are
+        stamped here and one record per notification goes to the trace file.
+        ``drop`` identifies the part of a split drop; rule counts apply to
+        the whole drop, not to each part.
+        """
+        if not self.ready and self._conn is not None:
+            # Start reconnecting now rather than after an earlier drop releases the lock
+            self._conn.kick()
         async with self._lock:
-            status = self.read_status()
-            if not status.get("isActive"):
-                return
+            if trace is not None:
+                trace["dispatched"] = time.time()
+                trace["bought"] = 0
+            try:
+                await self._handle(gifts, trace, drop)
+            finally:
+                if trace is not None and self._trace_log:
+                    self._trace_log.write(json.dumps(trace_record(trace, len(gifts))))
 
-            distribution_text = status.get("distribution", "")
-            if not distribution_text:
-                return
+    async def _handle(self, gifts: list[dict], trace: dict | None, drop: dict | None):
+        status = self.read_status()
+        if not status.get("isActive"):
+            return
 
-            rules = parse_distribution(distribution_text)
-            if not rules:
-                return
+        distribution_text = status.get("distribution", "")
+        if not distribution_text:
+            return
+
+        index = self._rule_index(distribution_text)
+        if not len(index):
+            return
 
-            if not self._client or not self._client.is_connected():
-                logger.warning("Telethon client not connected, skipping gifts")
+        if self._conn is None:
+            return
+        client = self._conn.client
+        if client is None:
+            # Losing the connection during a drop is the costly case: reconnect now and wait briefly
+            client = await self._conn.wait_ready(READY_GRACE)
+            if client is None:
+                logger.warning("No MTProto connection ready, skipping gifts")
                 return
 
+        stars = await self._balance.get()
+        if stars <= 0:
+            return
+
+        bought = self._drop_bought(drop, index)
+        plan = plan_purchases(gifts, index, stars, self._objective, filled=bought)
+        if trace is not None:
+            trace["planned"] = time.time()
+        if plan:
+            self._prefetch_forms(client, plan)
+            await self._execute(plan, index, stars, trace, bought)
+            self._balance.reconcile_soon()
+
+    def _rule_index(self, distribution_text: str) -> RuleIndex:
+        """Compiled distribution, rebuilt only when the text changes.
+
+        A distribution that does not parse (status.json can be edited by
+        hand) is logged once and the previous rules stay in force.
+        """
+        if self._index is None or distribution_text != self._index_source:
             try:
-                stars = await get_stars_balance(self._client)
+                index = compile_distribution(distribution_text)
             except Exception as e:
-                logger.error("Failed to get balance: %s", e)
-                return
+                logger.error("Invalid distribution %r, keeping previous rules: %s",
+                             distribution_text, e)
+                index = self._index if self._index is not None else compile_distribution("")
+            self._index = index
+            self._index_source = distribution_text
+        return self._index
 
-            if stars <= 0:
-                return
+    def _drop_bought(self, drop: dict | None, index: RuleIndex) -> list[int]:
+        """Units bought per rule so far in ``drop``, shared by all of its parts."""
+        if not drop or drop.get("parts", 1) <= 1:
+            return [0] * len(index)
+        entry = self._drops.get(drop["id"])
+        if entry is None or entry[0] is not index:
+            # New drop, or the distribution changed mid-drop: count from zero
+            entry = self._drops[drop["id"]] = (index, [0] * len(index), set())
+            while len(self._drops) > DROP_MEMORY:
+                self._drops.popitem(last=False)
+        entry[2].add(drop["part"])
+        if len(entry[2]) >= drop["parts"]:
+            del self._drops[drop["id"]]  # last part; the list lives on for this call
+        return entry[1]
+
+    def _prefetch_forms(self, client: TelegramClient, plan: list[Slot]):
+        # The plan is in priority order; warm the forms the first purchases need
+        gift_ids = list(dict.fromkeys(slot.gift_id for slot in plan))
+        for gid in gift_ids[:PREFETCH_TOP]:
+            prefetch_payment_form(client, self._forms, gid, self._peer)
+
+    async def _execute(
+        self,
+        plan: list[Slot],
+        index: RuleIndex,
+        stars: int,
+        trace: dict | None,
+        bought: list[int],
+    ):
+        sem = asyncio.Semaphore(self._concurrency)
+        failed: set[int] = set()
+        balance = stars
+        counts = index.counts
+        labels = index.labels
+
+        async def run(slot: Slot):
+            nonlocal balance
+            async with sem:
+                # After one unit of a gift fails, the rest of it would too
+                if slot.gift_id in failed:
+                    return
+                if not await self._buy(slot.gift_id):
+                    failed.add(slot.gift_id)
+                    self._balance.reconcile_soon()
+                    return
+
+            self._balance.debit(slot.stars)
+            balance -= slot.stars
+            if trace is not None:
+                trace.setdefault("paid", time.time())
+                trace["bought"] += 1
+            for i in slot.rules:
+                bought[i] += 1
+            range_info = ", ".join(
+                f"{labels[i]} ({bought[i]}/{counts[i]})" for i in slot.rules
+            )
+            log_line = (
+                f"Bought gift {slot.gift_id}, cost {slot.stars} stars, "
+                f"balance {balance}. Ranges: {range_info}"
+            )
+            logger.info(log_line)
+            self._append_log(log_line)
+
+        await asyncio.gather(*(run(slot) for slot in plan))
+
+    async def _buy(self, gid: int) -> bool:
+        for _ in range(FLOOD_RETRIES):
+            await self._pacer.wait()
+            # Picked per attempt, so purchases move to the standby as soon as the primary drops
+            client = self._conn.client
+            if client is None:
+                logger.error("pay_star_gift(%s) skipped: no MTProto connection ready", gid)
+                return False
+            try:
+                result = await pay_star_gift(
+                    client,
+                    gid,
+                    self._peer,
+                    message=None,
+                    hide_name=True,
+                    include_upgrade=False,
+                    form_cache=self._forms,
+                )
+            except FloodWaitError as e:
+                logger.warning("pay_star_gift(%s) hit FLOOD_WAIT %ds", gid, e.seconds)
+                if e.seconds > MAX_FLOOD_WAIT:
+                    return False
+                self._pacer.flood(e.seconds)
+                continue
+            except ConnectionError as e:
+                # Not retried: the payment may have reached Telegram before the connection died
+                logger.error("pay_star_gift(%s) lost its connection: %s", gid, e)
+                self._conn.failed(client)
+                return False
+            except Exception as e:
+                logger.error("pay_star_gift(%s) failed: %s", gid, e)
+                return False
 
-            # Build range counters
-            range_counters: dict[str, dict] = {}
-            for rule in rules:
-                range_key = f"{rule.min}-{rule.max}"
-                range_counters[range_key] = {"rule": rule, "bought": 0}
-
-            # Filter and sort gifts
-            available = [
-                g for g in gifts
-                if g.get("id") and g.get("availability_remains") and g["availability_remains"] > 0
-            ]
-            available.sort(key=lambda g: g.get("stars", 0), reverse=True)
-
-            for gift in available:
-                gid = str(gift["id"])
-                gift_stars = gift.get("stars", 0)
-                gift_avail = gift.get("availability_remains", 0)
-
-                applicable_rules = []
-                for rule in rules:
-                    range_key = f"{rule.min}-{rule.max}"
-                    counter = range_counters.get(range_key)
-                    if not counter:
-                        continue
-                    if gift_stars >= rule.min and gift_stars <= rule.max and counter["bought"] < rule.count:
-                        applicable_rules.append({"rule": rule, "range_key": range_key})
-
-                if not applicable_rules:
-                    continue
-
-                while gift_avail > 0 and stars >= gift_stars:
-                    active_rules = [
-                        ar for ar in applicable_rules
-                        if range_counters[ar["range_key"]]["bought"] < ar["rule"].count
-                    ]
-                    if not active_rules:
-                        break
-
-                    try:
-                        result = await pay_star_gift(
-                            self._client,
-                            int(gid),
-                            self._peer,
-                            message=None,
-                            hide_name=True,
-                            include_upgrade=False,
-                        )
-                    except Exception as e:
-                        logger.error("pay_star_gift(%s) failed: %s", gid, e)
-                        break
-
-                    if not result:
-                        logger.warning("pay_star_gift(%s) returned empty", gid)
-                        break
-
-                    stars -= gift_stars
-                    gift_avail -= 1
-
-                    for ar in active_rules:
-                        range_counters[ar["range_key"]]["bought"] += 1
-
-                    range_info = ", ".join(
-                        f"{ar['range_key']} ({range_counters[ar['range_key']]['bought']}/{ar['rule'].count})"
-                        for ar in active_rules
-                    )
-                    log_line = f"Bought gift {gid}, cost {gift_stars} stars, balance {stars}. Ranges: {range_info}"
-                    logger.info(log_line)
-                    self._append_log(log_line)
-
-                    await asyncio.sleep(0.2)
+            self._pacer.ok()
+            if not result:
+                logger.warning("pay_star_gift(%s) returned empty", gid)
+                return False
+            return True
+        return False
@@ -0,0 +1,118 @@
+import heapq
+import math
+from dataclasses import dataclass
+
+from .distribution import RuleIndex
+
+OBJECTIVE_SLOTS = "slots"
+OBJECTIVE_RARITY = "rarity"
+
+
+@dataclass(frozen=True)
+class Slot:
+    """One reserved unit of a gift, planned before any RPC is sent."""
+    gift_id: int
+    stars: int
+    rules: tuple[int, ...]  # indices into the compiled RuleIndex
+
+
+def _slot_weight(gift: dict) -> float:
+    return 1.0
+
+
+def _rarity_weight(gift: dict) -> float:
+    # The catalog only tells us the remaining supply; scarcer gifts are worth more
+    return 1.0 / max(1, gift.get("availability_remains") or 1)
+
+
+OBJECTIVES = {
+    OBJECTIVE_SLOTS: _slot_weight,
+    OBJECTIVE_RARITY: _rarity_weight,
+}
+
+
+def plan_purchases(
+    gifts: list[dict],
+    index: RuleIndex,
+    budget: int,
+    objective: str = OBJECTIVE_SLOTS,
+    filled: list[int] | None = None,
+) -> list[Slot]:
+    """Reserve budget and rule quotas for a drop, best value per star first.
+
+    A unit of a gift fills one slot in every applicable rule that is not yet
+    full and is worth ``weight(gift)`` per slot filled. Units are taken in
+    order of value per star, which for the ``slots`` objective means the
+    cheapest way to fill each rule, so cheap rules are no longer starved by
+    expensive gifts that happen to sort first.
+
+    Every gift whose price falls in the same segment of the rule index
+    shares the same applicable rules, so gifts are grouped by that set and
+    ranked once inside the group; the heap only holds each group's head, and
+    a head is re-scored lazily when one of its rules fills up. The returned
+    list is in priority order and never exceeds ``budget`` or a rule's count.
+
+    ``filled`` holds the units per rule already bought for the same drop,
+    when a large drop arrives in several parts; those slots are not offered
+    again.
+    """
+    weight = OBJECTIVES[objective]
+    counts = index.counts
+    reserved = list(filled) if filled is not None else [0] * len(index)
+
+    groups: dict[tuple[int, ...], list[list]] = {}
+    for gift in gifts:
+        if not gift.get("id") or (gift.get("availability_remains") or 0) <= 0:
+            continue
+        stars = gift.get("stars", 0)
+        if stars > budget:
+            continue
+        applicable = index.match(stars)
+        if applicable:
+            ratio = weight(gift) / stars if stars else math.inf
+            groups.setdefault(applicable, []).append(
+                [ratio, stars, int(gift["id"]), gift["availability_remains"]]
+            )
+
+    queues = []  # [applicable rules, gifts best-first, position of the head]
+    heap = []
+    for applicable, items in groups.items():
+        items.sort(key=lambda it: (-it[0], it[1]))
+        heap.append((-items[0][0] * len(applicable), items[0][1], len(queues)))
+        queues.append([applicable, items, 0])
+    heapq.heapify(heap)
+
+    plan: list[Slot] = []
+    while heap:
+        key = heapq.heappop(heap)
+        q = key[2]
+        applicable, items, pos = queues[q]
+        active = tuple(i for i in applicable if reserved[i] < counts[i])
+        if not active:
+            continue  # rules never empty again, so the whole group is done
+        # The budget only shrinks; gifts it can no longer cover are gone for good
+        while pos < len(items) and items[pos][1] > budget:
+            pos += 1
+        queues[q][2] = pos
+        if pos == len(items):
+            continue
+        ratio, stars, gid, remaining = items[pos]
+        fresh = (-ratio * len(active), stars, q)
+        if fresh != key:
+            heapq.heappush(heap, fresh)
+            continue
+
+        # Nothing else gains value while this run is reserved, so it stays the best pick
+        n = min(remaining, min(counts[i] - reserved[i] for i in active))
+        if stars:
+            n = min(n, budget // stars)
+        budget -= n * stars
+        for i in active:
+            reserved[i] += n
+        plan.extend([Slot(gift_id=gid, stars=stars, rules=active)] * n)
+
+        items[pos][3] = remaining - n
+        if remaining == n:
+            queues[q][2] = pos + 1
+        heapq.heappush(heap, key)
+    return plan
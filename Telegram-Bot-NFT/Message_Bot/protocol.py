@@ -2,17 +2,60 @@ import hashlib
 import hmac
 import json
 import os
+import struct
 import time
+from functools import lru_cache
 
 MAGIC = b"NFTB"
 MAX_TS_DRIFT = 120  # seconds
 
+# Payload formats inside the NFTB envelope. JSON payloads always start with
+# "{", binary ones with their version byte, so both parse without a flag.
+FORMAT_JSON = 0
+FORMAT_BINARY = 1
+FORMAT_BINARY_TRACE = 2  # binary with a drop-trace trailer
+FORMAT_BINARY_PARTS = 3  # binary with drop id, part index/count and trace stamps
+FORMATS = (FORMAT_JSON, FORMAT_BINARY, FORMAT_BINARY_TRACE, FORMAT_BINARY_PARTS)
+WIRE_FORMAT = FORMAT_BINARY_PARTS  # highest format this side understands
 
+# Backend-side stages of a drop trace, as Unix timestamps: the last poll that
+# saw no change, the poll that found the gifts, its response and the fan-out
+TRACE_STAGES = ("prev", "poll", "seen", "sent")
+
+MAX_DATAGRAM = 1200  # stays below the IPv6 minimum MTU, so never fragmented
+MAX_MESSAGE = 65507  # largest UDP datagram; unsplit formats must still fit it
+_ENVELOPE_SIZE = len(MAGIC) + 32
+
+_ACTION_CODES = {"new_gifts": 1}
+_ACTION_NAMES = {v: k for k, v in _ACTION_CODES.items()}
+_BIN_HEADER = struct.Struct("<BB16sQQH")  # version, action, nonce, ts, seq, count
+_BIN_GIFT = struct.Struct("<qIi")  # id, stars, availability_remains (-1 = None)
+_BIN_TRACE = struct.Struct("<8s4d")  # trace id, then TRACE_STAGES
+_BIN_PART = struct.Struct("<8sBB")  # drop id, part index, part count; follows the header
+_BIN_STAMPS = struct.Struct("<4d")  # TRACE_STAGES, all zero when the drop is not traced
+_BIN_PARTS_GIFTS_PER_DATAGRAM = (
+    (MAX_DATAGRAM - _ENVELOPE_SIZE - _BIN_HEADER.size - _BIN_PART.size - _BIN_STAMPS.size)
+    // _BIN_GIFT.size
+)
+MAX_PARTS = 255
+
+
+@lru_cache(maxsize=4096)
 def _derive_key(license_key: str) -> bytes:
     return hashlib.sha256(license_key.encode()).digest()
 
 
-def create_message(license_key: str, action: str, data: dict | None = None) -> bytes:
+def key_id(license_key: str) -> str:
+    """Public identifier of a license that does not reveal the key."""
+    return hashlib.sha256(_derive_key(license_key)).hexdigest()[:32]
+
+
+def encode_payload(action: str, data: dict | None = None, seq: int | None = None) -> bytes:
+    """Serialize a message body once so it can be signed for many keys.
+
+    Messages carrying a sequence number ``s`` are acknowledged by the
+    receiver with an ``ack`` message echoing it.
+    """
     if data is None:
         data = {}
     nonce = os.urandom(16).hex()
@@ -23,27 +66,202 @@ def create_message(license_key: str, action: str, data: dict | None = None) -> b
         "n": nonce,
         "ts": ts,
     }
-    payload = json.dumps(payload_dict, separators=(",", ":"), sort_keys=True).encode()
-    key = _derive_key(license_key)
+    if seq is not None:
+        payload_dict["s"] = seq
+    return json.dumps(payload_dict, separators=(",", ":"), sort_keys=True).encode()
+
+
+def negotiated_format(fmt) -> int:
+    """Wire format to send a peer that advertised ``fmt``.
+
+    A newer peer is capped at ``WIRE_FORMAT``; anything that is not one of
+    ``FORMATS`` (a negative number, a string, ``null``) gets JSON.
+    """
+    try:
+        fmt = min(int(fmt), WIRE_FORMAT)
+    except (TypeError, ValueError, OverflowError):
+        return FORMAT_JSON
+    return fmt if fmt in FORMATS else FORMAT_JSON
+
+
+def encode_gift_payloads(
+    gifts: list[dict], fmt: int, next_seq, trace: dict | None = None,
+) -> list[tuple[int, bytes]]:
+    """Encode a new_gifts list as ``(seq, payload)`` pairs.
+
+    Only ``FORMAT_BINARY_PARTS`` is split into datagrams under
+    ``MAX_DATAGRAM``: each part carries the drop id with its index and count
+    as ``d["drop"]``, so the buyer keeps rule quotas per drop rather than per
+    datagram. Older formats may reach frontends that would plan every part
+    from scratch, so they stay one message per drop, as before splitting;
+    JSON is only split, with ``d["drop"]``, past ``MAX_MESSAGE``.
+
+    ``next_seq`` is called once per payload. Binary encoding falls back to
+    JSON if a gift does not fit the fixed-width fields. ``trace`` (an ``id``
+    plus ``TRACE_STAGES``) rides along as ``d["trace"]`` in every format but
+    plain binary; its id doubles as the drop id.
+    """
+    drop_id = trace["id"] if trace is not None else os.urandom(8).hex()
+    if fmt >= FORMAT_BINARY:
+        try:
+            if fmt >= FORMAT_BINARY_PARTS:
+                return _encode_gifts_parts(gifts, next_seq, drop_id, trace)
+            carried = trace if fmt >= FORMAT_BINARY_TRACE else None
+            return _encode_gifts_binary(gifts, next_seq, carried)
+        except (ValueError, struct.error):
+            pass
+    return _encode_gifts_json(gifts, next_seq, drop_id, trace)
+
+
+def _encode_gifts_binary(
+    gifts: list[dict], next_seq, trace: dict | None,
+) -> list[tuple[int, bytes]]:
+    packed = [_pack_gift(g) for g in gifts]
+    if trace is None:
+        version, trailer = FORMAT_BINARY, b""
+    else:
+        version = FORMAT_BINARY_TRACE
+        trailer = _BIN_TRACE.pack(bytes.fromhex(trace["id"]), *_trace_stamps(trace))
+    size = _ENVELOPE_SIZE + _BIN_HEADER.size + len(packed) * _BIN_GIFT.size + len(trailer)
+    if size > MAX_MESSAGE:
+        raise ValueError("drop too large for one binary message")
+    seq = next_seq()
+    header = _BIN_HEADER.pack(
+        version, _ACTION_CODES["new_gifts"], os.urandom(16), int(time.time()), seq, len(packed),
+    )
+    return [(seq, header + b"".join(packed) + trailer)]
+
+
+def _encode_gifts_parts(
+    gifts: list[dict], next_seq, drop_id: str, trace: dict | None,
+) -> list[tuple[int, bytes]]:
+    packed = [_pack_gift(g) for g in gifts]
+    per_datagram = _BIN_PARTS_GIFTS_PER_DATAGRAM
+    parts = -(-len(packed) // per_datagram)
+    if parts > MAX_PARTS:
+        raise ValueError("drop too large for FORMAT_BINARY_PARTS")
+    drop = bytes.fromhex(drop_id)
+    stamps = _BIN_STAMPS.pack(*(_trace_stamps(trace) if trace is not None else (0.0,) * 4))
+    out = []
+    ts = int(time.time())
+    for part in range(parts):
+        chunk = packed[part * per_datagram:(part + 1) * per_datagram]
+        seq = next_seq()
+        header = _BIN_HEADER.pack(
+            FORMAT_BINARY_PARTS, _ACTION_CODES["new_gifts"], os.urandom(16), ts, seq, len(chunk),
+        )
+        out.append((seq, header + _BIN_PART.pack(drop, part, parts) + b"".join(chunk) + stamps))
+    return out
+
+
+def _pack_gift(g: dict) -> bytes:
+    return _BIN_GIFT.pack(
+        int(g["id"]),
+        int(g.get("stars") or 0),
+        -1 if g.get("availability_remains") is None else int(g["availability_remains"]),
+    )
+
+
+def _trace_stamps(trace: dict) -> list[float]:
+    return [float(trace.get(k) or 0.0) for k in TRACE_STAGES]
+
+
+def _encode_gifts_json(
+    gifts: list[dict], next_seq, drop_id: str, trace: dict | None,
+) -> list[tuple[int, bytes]]:
+    extra = {} if trace is None else {"trace": trace}
+    drop = {"id": drop_id, "part": MAX_PARTS, "parts": MAX_PARTS}
+    budget = MAX_MESSAGE - _ENVELOPE_SIZE - len(
+        encode_payload("new_gifts", {"gifts": [], "drop": drop, **extra}, seq=2**63)
+    )
+    chunks: list[list[dict]] = [[]]
+    used = 0
+    for g in gifts:
+        size = len(json.dumps(g, separators=(",", ":"))) + 1
+        if chunks[-1] and used + size > budget:
+            chunks.append([])
+            used = 0
+        chunks[-1].append(g)
+        used += size
+    out = []
+    for part, chunk in enumerate(chunks):
+        seq = next_seq()
+        data = {"gifts": chunk, "drop": {"id": drop_id, "part": part, "parts": len(chunks)}}
+        out.append((seq, encode_payload("new_gifts", {**data, **extra}, seq=seq)))
+    return out
+
+
+def _decode_binary(payload: bytes) -> dict | None:
+    try:
+        version, action, nonce, ts, seq, count = _BIN_HEADER.unpack_from(payload)
+    except struct.error:
+        return None
+    if version not in (FORMAT_BINARY, FORMAT_BINARY_TRACE, FORMAT_BINARY_PARTS):
+        return None
+    if action not in _ACTION_NAMES:
+        return None
+    start = _BIN_HEADER.size + (_BIN_PART.size if version == FORMAT_BINARY_PARTS else 0)
+    end = start + count * _BIN_GIFT.size
+    trailer = {FORMAT_BINARY_TRACE: _BIN_TRACE.size, FORMAT_BINARY_PARTS: _BIN_STAMPS.size}
+    if len(payload) != end + trailer.get(version, 0):
+        return None
+    gifts = [
+        {"id": str(gid), "stars": stars, "availability_remains": None if avail < 0 else avail}
+        for gid, stars, avail in _BIN_GIFT.iter_unpack(payload[start:end])
+    ]
+    data = {"gifts": gifts}
+    if version == FORMAT_BINARY_TRACE:
+        trace_id, *stamps = _BIN_TRACE.unpack_from(payload, end)
+        data["trace"] = {"id": trace_id.hex(), **dict(zip(TRACE_STAGES, stamps))}
+    elif version == FORMAT_BINARY_PARTS:
+        drop_id, part, parts = _BIN_PART.unpack_from(payload, _BIN_HEADER.size)
+        if part >= parts:
+            return None
+        data["drop"] = {"id": drop_id.hex(), "part": part, "parts": parts}
+        stamps = _BIN_STAMPS.unpack_from(payload, end)
+        if any(stamps):
+            data["trace"] = {"id": drop_id.hex(), **dict(zip(TRACE_STAGES, stamps))}
+    return {"a": _ACTION_NAMES[action], "d": data, "n": nonce.hex(), "ts": ts, "s": seq}
+
+
+def sign_payload(license_key: str, payload: bytes) -> bytes:
+    return sign_with_key(_derive_key(license_key), payload)
+
+
+def sign_with_key(key: bytes, payload: bytes) -> bytes:
     mac = hmac.new(key, payload, hashlib.sha256).digest()
     return MAGIC + mac + payload
 
 
+def create_message(
+    license_key: str, action: str, data: dict | None = None, seq: int | None = None,
+) -> bytes:
+    return sign_payload(license_key, encode_payload(action, data, seq))
+
+
 def parse_message(license_key: str, raw: bytes) -> dict | None:
+    return parse_with_key(_derive_key(license_key), raw)
+
+
+def parse_with_key(key: bytes, raw: bytes) -> dict | None:
     if len(raw) < 4 + 32:
         return None
     if raw[:4] != MAGIC:
         return None
     received_mac = raw[4:36]
     payload = raw[36:]
-    key = _derive_key(license_key)
     expected_mac = hmac.new(key, payload, hashlib.sha256).digest()
     if not hmac.compare_digest(received_mac, expected_mac):
         return None
-    try:
-        msg = json.loads(payload)
-    except json.JSONDecodeError:
-        return None
+    if payload[:1] == b"{":
+        try:
+            msg = json.loads(payload)
+        except json.JSONDecodeError:
+            return None
+    else:
+        msg = _decode_binary(payload)
+        if msg is None:
+            return None
     ts = msg.get("ts", 0)
     if abs(time.time() - ts) > MAX_TS_DRIFT:
         return None
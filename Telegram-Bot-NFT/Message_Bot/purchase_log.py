@@ -0,0 +1,112 @@
+import asyncio
+import logging
+import os
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+MAX_BYTES = 1024 * 1024  # rotate once the live file would grow past this
+BACKUP_COUNT = 3  # rotated segments kept next to the live file (bot.log.1 ... .N)
+FLUSH_INTERVAL = 1.0  # seconds a line may wait in the queue before it is written
+BATCH_SIZE = 64  # lines that force an early flush
+
+
+def latest_segment(path: str) -> str | None:
+    """Newest non-empty log segment, or None if there is nothing logged yet."""
+    for candidate in [path] + [f"{path}.{i}" for i in range(1, BACKUP_COUNT + 1)]:
+        try:
+            if os.path.getsize(candidate) > 0:
+                return candidate
+        except OSError:
+            continue
+    return None
+
+
+class PurchaseLog:
+    """Background, size-rotated writer for the purchase log.
+
+    ``write`` only stamps the line and queues it; a task batches queued lines
+    and appends them from a worker thread, so purchases never wait on disk.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        max_bytes: int = MAX_BYTES,
+        backup_count: int = BACKUP_COUNT,
+        flush_interval: float = FLUSH_INTERVAL,
+        batch_size: int = BATCH_SIZE,
+        timestamps: bool = True,
+    ):
+        self._path = path
+        self._max_bytes = max_bytes
+        self._backup_count = backup_count
+        self._flush_interval = flush_interval
+        self._batch_size = batch_size
+        self._timestamps = timestamps
+        self._queue: asyncio.Queue[str | None] = asyncio.Queue()
+        self._task: asyncio.Task | None = None
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def close(self):
+        """Write out everything queued so far and stop the writer."""
+        if self._task is None:
+            return
+        self._queue.put_nowait(None)
+        await self._task
+        self._task = None
+
+    def write(self, line: str):
+        if self._timestamps:
+            line = f"[{datetime.now().isoformat()}] {line}"
+        self._queue.put_nowait(line + "\n")
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        closing = False
+        while not closing:
+            first = await self._queue.get()
+            if first is None:
+                break
+            batch = [first]
+            deadline = loop.time() + self._flush_interval
+            while len(batch) < self._batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    line = await asyncio.wait_for(self._queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                if line is None:
+                    closing = True
+                    break
+                batch.append(line)
+            try:
+                await asyncio.to_thread(self._write_batch, "".join(batch))
+            except OSError as e:
+                logger.error("Failed to write purchase log: %s", e)
+
+    def _write_batch(self, text: str):
+        os.makedirs(os.path.dirname(self._path), exist_ok=True)
+        data = text.encode("utf-8")
+        try:
+            size = os.path.getsize(self._path)
+        except OSError:
+            size = 0
+        if size and size + len(data) > self._max_bytes:
+            self._rotate()
+        with open(self._path, "ab") as f:
+            f.write(data)
+
+    def _rotate(self):
+        for i in range(self._backup_count - 1, 0, -1):
+            src = f"{self._path}.{i}"
+            if os.path.exists(src):
+                os.replace(src, f"{self._path}.{i + 1}")
+        if self._backup_count > 0:
+            os.replace(self._path, f"{self._path}.1")
+        else:
+            os.remove(self._path)
@@ -0,0 +1,130 @@
+import asyncio
+import json
+import logging
+import os
+from typing import Callable
+
+logger = logging.getLogger(__name__)
+
+WATCH_INTERVAL = 1.0  # seconds between mtime checks for edits made outside the bot
+
+
+class StatusStore:
+    """In-process copy of ``status.json`` shared by the bot and the buyer.
+
+    Reads never touch the disk. Changes are applied in memory, announced to
+    subscribers and written through in the background via tmp +
+    ``os.replace``; back-to-back changes coalesce into one write. A watcher
+    reloads the file when its mtime moves without us having written it.
+    """
+
+    def __init__(self, path: str, watch_interval: float = WATCH_INTERVAL):
+        self._path = path
+        self._watch_interval = watch_interval
+        self._data: dict = {}
+        self._mtime: float | None = None
+        self._listeners: list[Callable[[dict], None]] = []
+        self._dirty = False
+        self._writer: asyncio.Task | None = None
+        self._watcher: asyncio.Task | None = None
+
+    def load(self):
+        """Synchronous initial read; call once before the event loop gets busy."""
+        data, mtime = self._read_file()
+        self._data = data
+        self._mtime = mtime
+
+    def start(self):
+        self.load()
+        self._watcher = asyncio.create_task(self._watch())
+
+    async def close(self):
+        if self._watcher:
+            self._watcher.cancel()
+            self._watcher = None
+        await self.flush()
+
+    def subscribe(self, callback: Callable[[dict], None]):
+        """Call ``callback(status)`` after every change, local or external."""
+        self._listeners.append(callback)
+        if self._data:
+            self._call(callback, self.get())
+
+    def get(self) -> dict:
+        # Callers edit the result and pass it back to set(); never hand out our own dict
+        return dict(self._data)
+
+    def set(self, data: dict):
+        self._data = dict(data)
+        self._notify()
+        self._dirty = True
+        if self._writer is None or self._writer.done():
+            self._writer = asyncio.create_task(self._write_loop())
+
+    def update(self, **changes):
+        self.set({**self._data, **changes})
+
+    async def flush(self):
+        if self._writer is not None:
+            await self._writer
+
+    def _notify(self):
+        snapshot = self.get()
+        for callback in self._listeners:
+            self._call(callback, snapshot)
+
+    @staticmethod
+    def _call(callback: Callable[[dict], None], snapshot: dict):
+        try:
+            callback(snapshot)
+        except Exception as e:
+            logger.error("Status listener failed: %s", e)
+
+    async def _write_loop(self):
+        while self._dirty:
+            self._dirty = False
+            try:
+                self._mtime = await asyncio.to_thread(self._write_file, dict(self._data))
+            except OSError as e:
+                logger.error("Failed to write %s: %s", self._path, e)
+                return
+
+    async def _watch(self):
+        while True:
+            await asyncio.sleep(self._watch_interval)
+            if self._writer is not None and not self._writer.done():
+                continue
+            try:
+                mtime = os.stat(self._path).st_mtime
+            except FileNotFoundError:
+                continue
+            if mtime == self._mtime:
+                continue
+            known = self._mtime
+            data, mtime = await asyncio.to_thread(self._read_file)
+            if self._mtime != known or (self._writer is not None and not self._writer.done()):
+                continue  # a local change raced the reload; it wins
+            self._mtime = mtime
+            if data != self._data:
+                logger.info("Status file changed on disk, reloaded")
+                self._data = data
+                self._notify()
+
+    def _read_file(self) -> tuple[dict, float | None]:
+        try:
+            mtime = os.stat(self._path).st_mtime
+            with open(self._path, "r") as f:
+                return json.load(f), mtime
+        except FileNotFoundError:
+            return {}, None
+        except json.JSONDecodeError:
+            # Half-written by an external editor; keep what we have and retry next tick
+            return dict(self._data), self._mtime
+
+    def _write_file(self, data: dict) -> float:
+        os.makedirs(os.path.dirname(self._path), exist_ok=True)
+        tmp = self._path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(data, f, indent=2, ensure_ascii=False)
+        os.replace(tmp, self._path)
+        return os.stat(self._path).st_mtime
@@ -0,0 +1,87 @@
+import asyncio
+import logging
+import time
+
+import aiohttp
+
+from .protocol import WIRE_FORMAT, create_message, key_id, parse_message
+
+logger = logging.getLogger(__name__)
+
+RECONNECT_MIN = 1.0
+RECONNECT_MAX = 30.0
+HEARTBEAT = 30.0
+
+
+class StreamClient:
+    """Receives new gift notifications from Backend over an outbound WebSocket.
+
+    Drop-in alternative to UdpListener for frontends that cannot expose a
+    UDP port (NAT, shared hosts).
+    """
+
+    def __init__(self, license_key: str, url: str):
+        self._license_key = license_key
+        self._url = url
+        self._task: asyncio.Task | None = None
+        self._callback = None
+        self.connected = False
+
+    def on_gifts(self, callback):
+        """Register callback: callback(gifts, trace: dict | None, drop: dict | None)
+
+        ``drop`` is ``{"id", "part", "parts"}``; large drops arrive in several
+        parts that share one id.
+        """
+        self._callback = callback
+
+    async def start(self):
+        self._task = asyncio.create_task(self._run())
+        logger.info("Stream client started (%s)", self._url)
+
+    def stop(self):
+        if self._task:
+            self._task.cancel()
+            self._task = None
+        logger.info("Stream client stopped")
+
+    async def _run(self):
+        delay = RECONNECT_MIN
+        url = f"{self._url}?id={key_id(self._license_key)}"
+        while True:
+            try:
+                async with aiohttp.ClientSession() as session:
+                    async with session.ws_connect(url, heartbeat=HEARTBEAT) as ws:
+                        hello = create_message(self._license_key, "hello", {"fmt": WIRE_FORMAT})
+                        await ws.send_bytes(hello)
+                        self.connected = True
+                        delay = RECONNECT_MIN
+                        logger.info("Stream connected to Backend")
+                        async for msg in ws:
+                            if msg.type == aiohttp.WSMsgType.BINARY:
+                                self._handle(msg.data)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning("Stream connection error: %s", e)
+            finally:
+                self.connected = False
+            logger.info("Stream disconnected, reconnecting in %.0fs", delay)
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, RECONNECT_MAX)
+
+    def _handle(self, data: bytes):
+        recv = time.time()
+        msg = parse_message(self._license_key, data)
+        if msg is None:
+            logger.warning("Invalid stream message")
+            return
+        if msg.get("a") == "new_gifts" and self._callback:
+            body = msg.get("d", {})
+            gifts = body.get("gifts", [])
+            trace = body.get("trace")
+            drop = body.get("drop")
+            if trace is not None:
+                trace = {**trace, "recv": recv, "parsed": time.time()}
+            if gifts:
+                asyncio.get_event_loop().create_task(self._callback(gifts, trace, drop))
@@ -1,6 +1,5 @@
 # -*- coding: utf-8 -*-
 import asyncio
-import json
 import logging
 import os
 import sys
@@ -22,12 +21,17 @@ if not getattr(sys, "frozen", False):
 
 from config import (
     BOT_TOKEN, ADMIN_ID, LICENSE_KEY,
-    API_ID, API_HASH,
-    UDP_LISTEN_HOST, UDP_LISTEN_PORT, STATUS_FILE, LOG_FILE,
+    API_ID, API_HASH, MTPROTO_STANDBY, STANDBY_SESSION_STRING,
+    UDP_LISTEN_HOST, UDP_LISTEN_PORT, BACKEND_STREAM_URL, STATUS_FILE, LOG_FILE, TRACE_FILE,
+    PURCHASE_CONCURRENCY, PURCHASE_OBJECTIVE, LOOP_MONITOR, LOOP_SLOW_THRESHOLD,
     load_session, save_session,
 )
 from Message_Bot.distribution import validate_distribution
 from Message_Bot.gift_buyer import GiftBuyer
+from Message_Bot.loop_monitor import LoopMonitor
+from Message_Bot.purchase_log import latest_segment
+from Message_Bot.status_store import StatusStore
+from Message_Bot.stream_client import StreamClient
 from Message_Bot.udp_listener import UdpListener
 
 logging.basicConfig(
@@ -40,10 +44,11 @@ logger = logging.getLogger(__name__)
 bot = Bot(token=BOT_TOKEN)
 dp = Dispatcher()
 user_states = {}
+status_store = StatusStore(STATUS_FILE)
 
-# GiftBuyer and UdpListener — created after session is available
+# GiftBuyer and UdpListener (or StreamClient) — created after session is available
 buyer: GiftBuyer | None = None
-udp: UdpListener | None = None
+udp: UdpListener | StreamClient | None = None
 
 # Telethon client used during /auth flow (not serializable, so module-level)
 _auth_client = None
@@ -51,7 +56,7 @@ _auth_client = None
 
 # ================== Session & buyer init ==================
 async def init_buyer():
-    """Initialize GiftBuyer and UdpListener with current session."""
+    """Initialize GiftBuyer and the gift feed (UDP or stream) with current session."""
     global buyer, udp
 
     session = load_session()
@@ -62,20 +67,27 @@ async def init_buyer():
         api_id=API_ID,
         api_hash=API_HASH,
         session_string=session,
-        status_file=STATUS_FILE,
+        status=status_store,
         log_file=LOG_FILE,
+        concurrency=PURCHASE_CONCURRENCY,
+        objective=PURCHASE_OBJECTIVE,
+        trace_file=TRACE_FILE,
+        standby_session=(STANDBY_SESSION_STRING or session) if MTPROTO_STANDBY else None,
     )
     await buyer.connect()
 
-    udp = UdpListener(
-        license_key=LICENSE_KEY,
-        host=UDP_LISTEN_HOST,
-        port=UDP_LISTEN_PORT,
-    )
+    if BACKEND_STREAM_URL:
+        udp = StreamClient(license_key=LICENSE_KEY, url=BACKEND_STREAM_URL)
+    else:
+        udp = UdpListener(
+            license_key=LICENSE_KEY,
+            host=UDP_LISTEN_HOST,
+            port=UDP_LISTEN_PORT,
+        )
     udp.on_gifts(buyer.handle_new_gifts)
     await udp.start()
 
-    logger.info("Buyer and UDP listener started")
+    logger.info("Buyer and %s started", type(udp).__name__)
     return True
 
 
@@ -185,29 +197,16 @@ async def _finish_auth(message: types.Message):
 
 # ================== Status helpers ==================
 def read_status() -> dict:
-    if buyer:
-        return buyer.read_status()
-    try:
-        with open(STATUS_FILE, "r") as f:
-            return json.load(f)
-    except (FileNotFoundError, json.JSONDecodeError):
-        return {}
+    return status_store.get()
 
 
 def write_status(data: dict):
-    if buyer:
-        buyer.write_status(data)
-        return
-    os.makedirs(os.path.dirname(STATUS_FILE), exist_ok=True)
-    tmp = STATUS_FILE + ".tmp"
-    with open(tmp, "w") as f:
-        json.dump(data, f, indent=2, ensure_ascii=False)
-    os.replace(tmp, STATUS_FILE)
+    status_store.set(data)
 
 
 def ensure_status():
+    # Existence, not emptiness: an unreadable file loads as {} and must not be overwritten
     if not os.path.exists(STATUS_FILE):
-        os.makedirs(os.path.dirname(STATUS_FILE), exist_ok=True)
         write_status({
             "isActive": False,
             "distribution": "",
@@ -327,13 +326,7 @@ async def handle_settings_buttons(message: types.Message):
         distribution = status.get("distribution", "")
         has_session = bool(load_session())
 
-        balance = 0
-        if buyer and buyer._client and buyer._client.is_connected():
-            try:
-                from Message_Bot.telegram_api import get_stars_balance
-                balance = await get_stars_balance(buyer._client)
-            except Exception:
-                pass
+        balance = await buyer.get_balance() if buyer else 0
 
         auth_line = "✅ авторизован" if has_session else "❌ не авторизован (/auth)"
         reply = (
@@ -383,16 +376,15 @@ async def handle_settings_buttons(message: types.Message):
         return True
 
     elif text == "📋 Лог-файл покупок за все время 📋":
-        if os.path.exists(LOG_FILE):
-            with open(LOG_FILE, "rb") as f:
-                content = f.read()
-            if content.strip():
-                await message.answer_document(
-                    types.BufferedInputFile(content, filename="bot_log.txt"),
-                    caption="📋 Лог-файл покупок"
-                )
-            else:
-                await message.answer("📭 Лог-файл пока пуст.")
+        # Rotation keeps every segment small; the newest one is streamed from disk
+        segment = latest_segment(LOG_FILE)
+        if segment:
+            await message.answer_document(
+                types.FSInputFile(segment, filename="bot_log.txt"),
+                caption="📋 Лог-файл покупок"
+            )
+        elif os.path.exists(LOG_FILE):
+            await message.answer("📭 Лог-файл пока пуст.")
         else:
             await message.answer("📭 Лог-файл пока не создан.")
         return True
@@ -470,6 +462,10 @@ dp.message.register(handle_settings_buttons, is_settings_button_predicate)
 
 # ================== Main ==================
 async def main():
+    monitor = LoopMonitor("talkbot", threshold=LOOP_SLOW_THRESHOLD) if LOOP_MONITOR else None
+    if monitor:
+        monitor.start()
+    status_store.start()
     ensure_status()
 
     session = load_session()
@@ -486,6 +482,9 @@ async def main():
             udp.stop()
         if buyer:
             await buyer.disconnect()
+        await status_store.close()
+        if monitor:
+            monitor.stop()
 
 
 if __name__ == "__main__":
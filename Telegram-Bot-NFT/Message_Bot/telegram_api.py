@@ -1,11 +1,19 @@
 import asyncio
 import logging
+import time
 
 from telethon import TelegramClient
-from telethon.tl import types as tl_types
+from telethon.errors import RPCError
+
+from .tl_compat import tl
 
 logger = logging.getLogger(__name__)
 
+FORM_TTL = 60.0  # seconds a fetched payment form is reused for the same invoice
+# SendStarsForm errors that mean the form itself is stale; anything else
+# (sold out, low balance, ...) would fail the same way with a fresh form
+STALE_FORM_ERRORS = frozenset({"FORM_EXPIRED", "FORM_ID_INVALID", "FORM_ID_EMPTY"})
+
 
 async def _retry(fn, attempts: int = 3, base_delay: float = 0.5):
     last_err = None
@@ -21,23 +29,27 @@ async def _retry(fn, attempts: int = 3, base_delay: float = 0.5):
 
 
 async def get_stars_balance(client: TelegramClient) -> int:
-    from telethon.tl.functions.payments import GetStarsStatusRequest
+    try:
+        return await fetch_stars_balance(client)
+    except Exception as e:
+        logger.error("get_stars_balance failed: %s", e)
+        return 0
+
+
+async def fetch_stars_balance(client: TelegramClient) -> int:
+    """Like get_stars_balance, but raises instead of reporting 0 on failure."""
+    GetStarsStatusRequest = tl("payments.GetStarsStatusRequest")
 
     try:
-        res = await client(GetStarsStatusRequest(peer=tl_types.InputPeerSelf()))
-        return _extract_balance(res)
+        res = await client(GetStarsStatusRequest(peer=tl("InputPeerSelf")()))
     except Exception:
-        try:
-            me = await client.get_me()
-            peer = await client.get_input_entity(me)
-            res = await client(GetStarsStatusRequest(peer=peer))
-            return _extract_balance(res)
-        except Exception as e:
-            logger.error("get_stars_balance failed: %s", e)
-            return 0
+        me = await client.get_me()
+        peer = await client.get_input_entity(me)
+        res = await client(GetStarsStatusRequest(peer=peer))
+    return extract_balance(res)
 
 
-def _extract_balance(res) -> int:
+def extract_balance(res) -> int:
     balance = getattr(res, "balance", None)
     if balance is None:
         return 0
@@ -46,37 +58,38 @@ def _extract_balance(res) -> int:
     return int(val)
 
 
-async def pay_star_gift(
-    client: TelegramClient,
-    gift_id: int,
-    peer,
-    message: str | None = None,
-    hide_name: bool = True,
-    include_upgrade: bool = False,
-):
-    from telethon import _tl as Api
+class PaymentFormCache:
+    """Payment forms keyed by invoice parameters.
 
-    InputInvoiceStarGift = getattr(Api, "InputInvoiceStarGift", None)
-    if InputInvoiceStarGift is None:
-        try:
-            from telethon.tl.types import InputInvoiceStarGift
-        except ImportError:
-            raise ImportError("InputInvoiceStarGift not found in Telethon")
+    Entries hold the fetch future itself, so concurrent purchases of the
+    same gift share one GetPaymentForm call and a speculative prefetch can
+    be awaited by the purchase that follows it.
+    """
 
-    GetPaymentForm = getattr(getattr(Api, "payments", None), "GetPaymentFormRequest", None)
-    if GetPaymentForm is None:
-        try:
-            from telethon.tl.functions.payments import GetPaymentFormRequest as GetPaymentForm
-        except ImportError:
-            raise ImportError("GetPaymentFormRequest not found in Telethon")
+    def __init__(self, ttl: float = FORM_TTL):
+        self._ttl = ttl
+        self._forms: dict[tuple, tuple[float, asyncio.Future]] = {}
+
+    def get(self, key: tuple, fetch) -> asyncio.Future:
+        now = time.monotonic()
+        entry = self._forms.get(key)
+        if entry is not None and entry[0] > now:
+            fut = entry[1]
+            if not fut.done() or (not fut.cancelled() and fut.exception() is None):
+                return fut
+        fut = asyncio.ensure_future(fetch())
+        self._forms[key] = (now + self._ttl, fut)
+        return fut
+
+    def invalidate(self, key: tuple, fut: asyncio.Future | None = None):
+        """Drop the entry for ``key``; with ``fut``, only if it is still that fetch,
+        so a purchase holding an old form can't discard another's fresh one."""
+        entry = self._forms.get(key)
+        if entry is not None and (fut is None or entry[1] is fut):
+            del self._forms[key]
 
-    SendStarsForm = getattr(getattr(Api, "payments", None), "SendStarsFormRequest", None)
-    if SendStarsForm is None:
-        try:
-            from telethon.tl.functions.payments import SendStarsFormRequest as SendStarsForm
-        except ImportError:
-            raise ImportError("SendStarsFormRequest not found in Telethon")
 
+def _star_gift_invoice(gift_id: int, peer, message: str | None, hide_name: bool, include_upgrade: bool):
     invoice_params = {
         "gift_id": gift_id,
         "peer": peer,
@@ -84,16 +97,63 @@ async def pay_star_gift(
         "include_upgrade": include_upgrade,
     }
     if message:
-        TextWithEntities = getattr(Api, "TextWithEntities", None)
-        if TextWithEntities is None:
-            from telethon.tl.types import TextWithEntities
-        invoice_params["message"] = TextWithEntities(text=message, entities=[])
-
-    invoice = InputInvoiceStarGift(**invoice_params)
-
-    payment_form = await client(GetPaymentForm(invoice=invoice))
-    result = await client(SendStarsForm(
-        form_id=payment_form.form_id,
-        invoice=invoice,
-    ))
-    return result
+        invoice_params["message"] = tl("TextWithEntities")(text=message, entities=[])
+
+    return tl("InputInvoiceStarGift")(**invoice_params)
+
+
+def _form_key(gift_id: int, peer, message: str | None, hide_name: bool, include_upgrade: bool) -> tuple:
+    return (gift_id, str(peer), message, hide_name, include_upgrade)
+
+
+async def _get_payment_form(client: TelegramClient, invoice):
+    return await client(tl("payments.GetPaymentFormRequest")(invoice=invoice))
+
+
+def prefetch_payment_form(
+    client: TelegramClient,
+    form_cache: PaymentFormCache,
+    gift_id: int,
+    peer,
+    message: str | None = None,
+    hide_name: bool = True,
+    include_upgrade: bool = False,
+) -> asyncio.Future:
+    """Start fetching the payment form for a likely purchase without waiting."""
+    key = _form_key(gift_id, peer, message, hide_name, include_upgrade)
+    invoice = _star_gift_invoice(gift_id, peer, message, hide_name, include_upgrade)
+    fut = form_cache.get(key, lambda: _get_payment_form(client, invoice))
+    # A failed warm-up is retried by the purchase itself; don't log it as unretrieved
+    fut.add_done_callback(lambda f: f.cancelled() or f.exception())
+    return fut
+
+
+async def pay_star_gift(
+    client: TelegramClient,
+    gift_id: int,
+    peer,
+    message: str | None = None,
+    hide_name: bool = True,
+    include_upgrade: bool = False,
+    form_cache: PaymentFormCache | None = None,
+):
+    SendStarsForm = tl("payments.SendStarsFormRequest")
+    invoice = _star_gift_invoice(gift_id, peer, message, hide_name, include_upgrade)
+
+    if form_cache is None:
+        payment_form = await _get_payment_form(client, invoice)
+        return await client(SendStarsForm(form_id=payment_form.form_id, invoice=invoice))
+
+    key = _form_key(gift_id, peer, message, hide_name, include_upgrade)
+    fut = form_cache.get(key, lambda: _get_payment_form(client, invoice))
+    payment_form = await fut
+    try:
+        return await client(SendStarsForm(form_id=payment_form.form_id, invoice=invoice))
+    except RPCError as e:
+        if e.message not in STALE_FORM_ERRORS:
+            raise
+        # The cached form expired; retry once with a fresh one
+        logger.info("Cached payment form for %s rejected (%s), refetching", gift_id, e)
+        form_cache.invalidate(key, fut)
+        payment_form = await form_cache.get(key, lambda: _get_payment_form(client, invoice))
+        return await client(SendStarsForm(form_id=payment_form.form_id, invoice=invoice))
@@ -0,0 +1,40 @@
+"""Telethon TL constructors, resolved once per name.
+
+Telethon 1.x exposes the schema as ``telethon.tl.functions`` and
+``telethon.tl.types``; newer builds as ``telethon._tl``. Looking a name up
+walks both, so the result is cached and the hot path pays one dict hit.
+"""
+import importlib
+from functools import lru_cache
+
+
+def _walk(module, path: list[str]):
+    obj = module
+    for part in path:
+        obj = getattr(obj, part, None)
+        if obj is None:
+            return None
+    return obj
+
+
+@lru_cache(maxsize=None)
+def tl(name: str):
+    """Resolve ``"payments.GetStarGiftsRequest"``, ``"InputInvoiceStarGift"``, ..."""
+    path = name.split(".")
+    roots = ["telethon._tl"]
+    roots.append("telethon.tl.functions" if path[-1].endswith("Request") else "telethon.tl.types")
+    for root in roots:
+        try:
+            module = importlib.import_module(root)
+        except ImportError:
+            continue
+        obj = _walk(module, path)
+        if obj is None and len(path) > 1:
+            # Sub-namespaces are modules in 1.x and may not be imported yet
+            try:
+                obj = _walk(importlib.import_module(f"{root}.{'.'.join(path[:-1])}"), path[-1:])
+            except ImportError:
+                pass
+        if obj is not None:
+            return obj
+    raise ImportError(f"{name} not found in Telethon")
@@ -1,10 +1,14 @@
 import asyncio
 import logging
+import time
+from collections import OrderedDict
 
-from .protocol import parse_message
+from .protocol import MAX_TS_DRIFT, WIRE_FORMAT, _derive_key, create_message, parse_with_key
 
 logger = logging.getLogger(__name__)
 
+REPLAY_CACHE_SIZE = 4096  # nonces remembered at most; oldest are evicted first
+
 
 class UdpListener:
     """Listens for UDP messages from Backend (new gift notifications)."""
@@ -18,7 +22,11 @@ class UdpListener:
         self._callback = None
 
     def on_gifts(self, callback):
-        """Register callback: callback(gifts: list[dict])"""
+        """Register callback: callback(gifts, trace: dict | None, drop: dict | None)
+
+        ``drop`` is ``{"id", "part", "parts"}``; large drops arrive in several
+        parts that share one id.
+        """
         self._callback = callback
 
     async def start(self):
@@ -35,23 +43,92 @@ class UdpListener:
             self._transport = None
         logger.info("UDP listener stopped")
 
+    @property
+    def port(self) -> int:
+        """Bound port; differs from the configured one when that was 0."""
+        if self._transport is None:
+            return self._port
+        return self._transport.get_extra_info("sockname")[1]
+
+    def stats(self) -> dict:
+        p = self._protocol
+        if p is None:
+            return {}
+        return {"received": p.received, "duplicates": p.duplicates, "acks_sent": p.acks_sent}
+
+
+class _ReplayCache:
+    """Nonces of accepted messages, kept until their timestamp leaves the
+    ``MAX_TS_DRIFT`` window; after that ``parse_message`` rejects them anyway."""
+
+    def __init__(self, max_size: int = REPLAY_CACHE_SIZE):
+        self._max_size = max_size
+        self._expiry: OrderedDict[str, float] = OrderedDict()
+
+    def seen(self, nonce: str, ts: float) -> bool:
+        """Return True if ``nonce`` was already accepted, otherwise remember it."""
+        now = time.time()
+        expiry = self._expiry
+        while expiry:
+            oldest, exp = next(iter(expiry.items()))
+            if exp > now and len(expiry) < self._max_size:
+                break
+            del expiry[oldest]
+        if nonce in expiry:
+            return True
+        expiry[nonce] = ts + MAX_TS_DRIFT
+        return False
+
 
 class _UdpProtocol(asyncio.DatagramProtocol):
     def __init__(self, license_key: str, callback):
         self._license_key = license_key
+        self._key = _derive_key(license_key)
         self._callback = callback
+        self._transport: asyncio.DatagramTransport | None = None
+        self._replay = _ReplayCache()
+        self.received = 0
+        self.duplicates = 0
+        self.acks_sent = 0
+
+    def connection_made(self, transport):
+        self._transport = transport
 
     def datagram_received(self, data: bytes, addr: tuple):
-        msg = parse_message(self._license_key, data)
+        recv = time.time()
+        msg = parse_with_key(self._key, data)
         if msg is None:
             logger.warning("Invalid UDP message from %s", addr)
             return
 
+        seq = msg.get("s")
+        if seq is not None:
+            # Always ACK, even duplicates: the previous ACK may have been lost
+            self._ack(seq, addr)
+
+        # Retransmits and replays carry the same nonce as the original
+        if self._replay.seen(msg.get("n", ""), msg.get("ts", 0)):
+            self.duplicates += 1
+            return
+
         action = msg.get("a")
         if action == "new_gifts" and self._callback:
-            gifts = msg.get("d", {}).get("gifts", [])
+            self.received += 1
+            body = msg.get("d", {})
+            gifts = body.get("gifts", [])
+            trace = body.get("trace")
+            drop = body.get("drop")
+            if trace is not None:
+                trace = {**trace, "recv": recv, "parsed": time.time()}
             if gifts:
-                asyncio.get_event_loop().create_task(self._callback(gifts))
+                asyncio.get_event_loop().create_task(self._callback(gifts, trace, drop))
 
     def error_received(self, exc):
         logger.error("UDP error: %s", exc)
+
+    def _ack(self, seq: int, addr: tuple):
+        if self._transport is None:
+            return
+        ack = create_message(self._license_key, "ack", {"s": seq, "fmt": WIRE_FORMAT})
+        self._transport.sendto(ack, addr)
+        self.acks_sent += 1
@@ -23,14 +23,33 @@ LICENSE_KEY = os.getenv("LICENSE_KEY", "")
 API_ID = 37178559
 API_HASH = "ac248466661ba17e936335d08f6eb26d"
 SESSION_STRING = os.getenv("SESSION_STRING", "")
+# Second MTProto connection kept warm for purchases while the main one reconnects.
+# STANDBY_SESSION_STRING may name a separately authorized session; by default it reuses the main one
+MTPROTO_STANDBY = os.getenv("MTPROTO_STANDBY", "0") == "1"
+STANDBY_SESSION_STRING = os.getenv("STANDBY_SESSION_STRING", "")
 
 # ================== UDP listener ==================
 UDP_LISTEN_HOST = "0.0.0.0"
 UDP_LISTEN_PORT = int(os.getenv("UDP_LISTEN_PORT", "0"))
 
+# ================== Backend stream ==================
+# ws://host:8090/stream — when set, gifts arrive over WebSocket instead of UDP
+BACKEND_STREAM_URL = os.getenv("BACKEND_STREAM_URL", "")
+
+# ================== Purchases ==================
+PURCHASE_CONCURRENCY = int(os.getenv("PURCHASE_CONCURRENCY", "3"))
+# "slots" fills as many distribution slots as the balance allows; "rarity" favours scarce gifts
+PURCHASE_OBJECTIVE = os.getenv("PURCHASE_OBJECTIVE", "slots")
+
+# ================== Diagnostics ==================
+# Event loop lag probe and stall watchdog; logs the stack of callbacks that block the loop
+LOOP_MONITOR = os.getenv("LOOP_MONITOR", "0") == "1"
+LOOP_SLOW_THRESHOLD = float(os.getenv("LOOP_SLOW_THRESHOLD", "0.1"))
+
 # ================== Data paths ==================
 STATUS_FILE = str(PROJECT_ROOT / "data" / "status.json")
 LOG_FILE = str(PROJECT_ROOT / "data" / "bot.log")
+TRACE_FILE = str(PROJECT_ROOT / "data" / "drop_trace.jsonl")  # per-drop stage timings
 SESSION_FILE = str(PROJECT_ROOT / "data" / "session.string")
 
 
@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# Same import root as talkbot.py: the project directory, so "Message_Bot.*" resolves
+sys.path.insert(0, str(Path(__file__).parent.parent.resolve()))
@@ -0,0 +1,60 @@
+import random
+
+from Message_Bot.distribution import (
+    INF, PurchaseRule, RuleIndex, compile_distribution, parse_distribution,
+)
+
+
+def brute_force(rules: list[PurchaseRule], price: float) -> tuple[int, ...]:
+    return tuple(i for i, r in enumerate(rules) if r.min <= price <= r.max)
+
+
+def random_rules(rng: random.Random) -> list[PurchaseRule]:
+    rules = []
+    for _ in range(rng.randint(1, 12)):
+        lo, hi = sorted(rng.choice([0, 1, 15, 50, 100, 1000, 2500, 10000]) for _ in range(2))
+        kind = rng.choice(["range", "min", "max", "point"])
+        if kind == "min":
+            hi = INF
+        elif kind == "max":
+            lo = 0.0
+        elif kind == "point":
+            hi = lo
+        rules.append(PurchaseRule(min=float(lo), max=float(hi), count=rng.randint(1, 5)))
+    return rules
+
+
+def test_parse_operators():
+    rules = parse_distribution("<100 2\n>=100 и <=1000 3\n>1000 1\n=500 4")
+    assert [(r.min, r.max, r.count) for r in rules] == [
+        (0.0, 99.0, 2),
+        (100.0, 1000.0, 3),
+        (1001.0, INF, 1),
+        (500.0, 500.0, 4),
+    ]
+
+
+def test_empty_distribution_matches_nothing():
+    index = compile_distribution("")
+    assert len(index) == 0
+    assert index.match(100) == ()
+
+
+def test_match_agrees_with_brute_force():
+    rng = random.Random(17)
+    for _ in range(500):
+        rules = random_rules(rng)
+        index = RuleIndex(rules)
+        bounds = {r.min for r in rules} | {r.max for r in rules if r.max != INF}
+        prices = {0, 1, 10**6}
+        for b in bounds:
+            prices.update({b - 1, b - 0.5, b, b + 0.5, b + 1})
+        prices.update(rng.uniform(0, 12000) for _ in range(20))
+        for price in prices:
+            assert index.match(price) == brute_force(rules, price), (rules, price)
+
+
+def test_counts_and_labels_follow_rule_order():
+    index = compile_distribution("<=100 5\n>100 2")
+    assert index.counts == [5, 2]
+    assert index.labels == ["0.0-100.0", "101.0-inf"]
@@ -0,0 +1,103 @@
+import asyncio
+import itertools
+import json
+from types import SimpleNamespace
+
+import pytest
+
+from Message_Bot import protocol
+from Message_Bot.balance_tracker import BalanceTracker
+from Message_Bot.connection import ConnectionSupervisor
+from Message_Bot.gift_buyer import GiftBuyer
+from Message_Bot.protocol import (
+    FORMAT_BINARY_PARTS, FORMAT_JSON, encode_gift_payloads, parse_message, sign_payload,
+)
+from Message_Bot.status_store import StatusStore
+from Message_Bot.tl_compat import tl
+
+
+class FakeClient:
+    """Answers the handful of requests a purchase makes; counts the payments."""
+
+    def __init__(self, balance: int):
+        self.balance = balance
+        self.paid = 0
+
+    def is_connected(self):
+        return True
+
+    async def connect(self):
+        pass
+
+    async def disconnect(self):
+        pass
+
+    def add_event_handler(self, callback, event=None):
+        pass
+
+    def remove_event_handler(self, callback, event=None):
+        pass
+
+    async def __call__(self, request):
+        name = type(request).__name__
+        if name == "GetStarsStatusRequest":
+            return SimpleNamespace(balance=SimpleNamespace(amount=self.balance))
+        if name == "GetPaymentFormRequest":
+            return SimpleNamespace(form_id=1)
+        if name == "SendStarsFormRequest":
+            self.paid += 1
+            return SimpleNamespace(ok=True)
+        return request  # PingRequest
+
+
+class OfflineBuyer(GiftBuyer):
+    def __init__(self, client: FakeClient, *args, **kwargs):
+        super().__init__(0, "", "", *args, **kwargs)
+        self.client = client
+
+    async def connect(self):
+        self._conn = ConnectionSupervisor(self.client)
+        await self._conn.start()
+        self._peer = tl("InputPeerSelf")()
+        self._balance = BalanceTracker(self.client)
+        await self._balance.start()
+        self._log.start()
+
+
+@pytest.mark.parametrize("wire_format", [FORMAT_JSON, FORMAT_BINARY_PARTS])
+def test_rule_counts_span_every_notification_of_a_drop(tmp_path, monkeypatch, wire_format):
+    # 30 gifts at 10 per datagram: one drop, three notifications
+    monkeypatch.setattr(protocol, "_BIN_PARTS_GIFTS_PER_DATAGRAM", 10)
+    monkeypatch.setattr(protocol, "MAX_MESSAGE", 1500)
+    gifts = [{"id": str(1000 + i), "stars": 150, "availability_remains": 5} for i in range(30)]
+
+    async def run() -> tuple[int, int]:
+        status = StatusStore(str(tmp_path / "status.json"))
+        status.set({"isActive": True, "distribution": ">=100 2"})
+        client = FakeClient(balance=10**6)
+        buyer = OfflineBuyer(client, status, str(tmp_path / "purchases.log"))
+        await buyer.connect()
+        payloads = encode_gift_payloads(gifts, wire_format, itertools.count().__next__)
+        for _, payload in payloads:
+            msg = parse_message("key", sign_payload("key", payload))
+            await buyer.handle_new_gifts(msg["d"]["gifts"], None, msg["d"].get("drop"))
+        await buyer.disconnect()
+        await status.close()
+        return len(payloads), client.paid
+
+    parts, paid = asyncio.run(run())
+    assert parts > 1
+    assert paid == 2
+
+
+def test_malformed_distribution_keeps_previous_rules(tmp_path):
+    # status.json can be edited by hand; a bad distribution must not stop the bot
+    path = tmp_path / "status.json"
+    path.write_text(json.dumps({"isActive": True, "distribution": "<=100 abc"}))
+    status = StatusStore(str(path))
+    status.load()
+    buyer = OfflineBuyer(FakeClient(balance=0), status, str(tmp_path / "purchases.log"))
+    assert len(buyer._rule_index("<=100 abc")) == 0
+
+    good = buyer._rule_index(">=100 2")
+    assert buyer._rule_index("<=100 abc") is good
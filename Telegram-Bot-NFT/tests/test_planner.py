@@ -0,0 +1,92 @@
+import random
+from collections import Counter
+
+from Message_Bot.distribution import compile_distribution
+from Message_Bot.planner import OBJECTIVES, plan_purchases
+
+DISTRIBUTIONS = [
+    "<=100 3",
+    "<=100 2\n>100 и <=1000 2\n>1000 1",
+    ">=50 5\n<=500 4\n=250 2",
+    "<100 1\n>=100 и <=200 3\n>=150 2\n>5000 1",
+]
+
+
+def random_gifts(rng: random.Random, n: int) -> list[dict]:
+    gifts = []
+    for i in range(n):
+        gift = {
+            "id": str(1000 + i),
+            "stars": rng.choice([0, 15, 50, 99, 100, 150, 200, 250, 500, 1000, 2500, 10000]),
+            "availability_remains": rng.choice([None, 0, 1, 2, 5, 100]),
+        }
+        if rng.random() < 0.05:
+            del gift["id"]
+        gifts.append(gift)
+    return gifts
+
+
+def check_plan(plan, gifts, index, budget, filled=None):
+    by_id = {int(g["id"]): g for g in gifts if g.get("id")}
+    assert sum(slot.stars for slot in plan) <= budget
+
+    units = Counter(slot.gift_id for slot in plan)
+    for gid, n in units.items():
+        assert n <= by_id[gid]["availability_remains"]
+
+    per_rule = list(filled) if filled is not None else [0] * len(index)
+    for slot in plan:
+        assert slot.stars == by_id[slot.gift_id]["stars"]
+        assert slot.rules
+        assert set(slot.rules) <= set(index.match(slot.stars))
+        for i in slot.rules:
+            per_rule[i] += 1
+    for i, count in enumerate(index.counts):
+        assert per_rule[i] <= max(count, filled[i] if filled else 0)
+    return per_rule
+
+
+def test_plan_respects_budget_counts_and_availability():
+    rng = random.Random(20)
+    for _ in range(300):
+        index = compile_distribution(rng.choice(DISTRIBUTIONS))
+        gifts = random_gifts(rng, rng.randint(0, 40))
+        budget = rng.choice([0, 15, 100, 300, 1000, 5000, 10**6])
+        for objective in OBJECTIVES:
+            plan = plan_purchases(gifts, index, budget, objective)
+            check_plan(plan, gifts, index, budget)
+
+
+def test_cheap_rules_are_not_starved():
+    index = compile_distribution("<=100 2\n>1000 1")
+    gifts = [
+        {"id": "1", "stars": 5000, "availability_remains": 10},
+        {"id": "2", "stars": 50, "availability_remains": 10},
+    ]
+    plan = plan_purchases(gifts, index, 5100)
+    assert Counter(slot.gift_id for slot in plan) == {1: 1, 2: 2}
+
+
+def test_filled_rules_are_not_offered_again():
+    index = compile_distribution("<=100 3")
+    gifts = [{"id": "1", "stars": 50, "availability_remains": 10}]
+    assert len(plan_purchases(gifts, index, 10**6, filled=[2])) == 1
+    assert plan_purchases(gifts, index, 10**6, filled=[3]) == []
+
+
+def test_drop_split_across_notifications_keeps_rule_counts():
+    rng = random.Random(11)
+    for _ in range(200):
+        index = compile_distribution(rng.choice(DISTRIBUTIONS))
+        gifts = random_gifts(rng, rng.randint(10, 60))
+        budget = rng.choice([300, 5000, 10**6])
+        filled = [0] * len(index)
+        spent = 0
+        # Each part is planned on its own, as GiftBuyer does, with the drop's running counts
+        for start in range(0, len(gifts), 10):
+            part = gifts[start:start + 10]
+            plan = plan_purchases(part, index, budget - spent, filled=filled)
+            filled = check_plan(plan, part, index, budget - spent, filled)
+            spent += sum(slot.stars for slot in plan)
+        assert spent <= budget
+        assert all(n <= count for n, count in zip(filled, index.counts))
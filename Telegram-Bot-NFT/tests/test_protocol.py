@@ -0,0 +1,108 @@
+import itertools
+from pathlib import Path
+
+import pytest
+
+from Message_Bot import protocol
+from Message_Bot.protocol import (
+    FORMAT_BINARY, FORMAT_BINARY_PARTS, FORMAT_BINARY_TRACE, FORMAT_JSON, FORMATS, TRACE_STAGES,
+    WIRE_FORMAT, encode_gift_payloads, negotiated_format, parse_message, sign_payload,
+)
+
+KEY = "test-license"
+BACKEND_PROTOCOL = Path(__file__).parents[2] / "Backend" / "engine" / "protocol.py"
+
+GIFTS = [
+    {"id": "5170145012310081615", "stars": 15, "availability_remains": 3},
+    {"id": "6028601630662853006", "stars": 2500, "availability_remains": None},
+    {"id": "1", "stars": 0, "availability_remains": 0},
+]
+
+
+def roundtrip(gifts, fmt, trace=None) -> list[dict]:
+    payloads = encode_gift_payloads(gifts, fmt, itertools.count(1).__next__, trace)
+    msgs = [parse_message(KEY, sign_payload(KEY, p)) for _, p in payloads]
+    assert all(m is not None for m in msgs)
+    assert [m["s"] for m in msgs] == [seq for seq, _ in payloads]
+    return msgs
+
+
+def make_trace() -> dict:
+    return {"id": "0123456789abcdef", **{k: 1700000000.0 + i for i, k in enumerate(TRACE_STAGES)}}
+
+
+@pytest.mark.parametrize("fmt", FORMATS)
+def test_roundtrip(fmt):
+    (msg,) = roundtrip(GIFTS, fmt)
+    assert msg["a"] == "new_gifts"
+    assert msg["d"]["gifts"] == GIFTS
+
+
+@pytest.mark.parametrize("fmt", FORMATS)
+def test_trace_is_carried_by_every_format_but_plain_binary(fmt):
+    trace = make_trace()
+    (msg,) = roundtrip(GIFTS, fmt, trace)
+    if fmt == FORMAT_BINARY:
+        assert "trace" not in msg["d"]
+    else:
+        assert msg["d"]["trace"] == trace
+
+
+def test_parts_split_a_large_drop():
+    gifts = [
+        {"id": str(1000 + i), "stars": 100 + i, "availability_remains": i % 3 or None}
+        for i in range(200)
+    ]
+    msgs = roundtrip(gifts, FORMAT_BINARY_PARTS)
+    drops = [m["d"]["drop"] for m in msgs]
+    assert len(msgs) > 1
+    assert {d["id"] for d in drops} == {drops[0]["id"]}
+    assert [(d["part"], d["parts"]) for d in drops] == [(i, len(msgs)) for i in range(len(msgs))]
+    assert [g for m in msgs for g in m["d"]["gifts"]] == gifts
+
+
+@pytest.mark.parametrize("fmt", [FORMAT_BINARY, FORMAT_BINARY_TRACE, FORMAT_BINARY_PARTS])
+def test_id_outside_int64_falls_back_to_json(fmt):
+    gifts = [{"id": str(2**63), "stars": 15, "availability_remains": 1}]
+    ((_, payload),) = encode_gift_payloads(gifts, fmt, itertools.count(1).__next__)
+    assert payload[:1] == b"{"
+    assert parse_message(KEY, sign_payload(KEY, payload))["d"]["gifts"] == gifts
+
+
+def binary_parts_payload() -> bytearray:
+    ((_, payload),) = encode_gift_payloads(GIFTS, FORMAT_BINARY_PARTS, itertools.count(1).__next__)
+    return bytearray(payload)
+
+
+@pytest.mark.parametrize("part, parts", [(1, 1), (3, 2), (0, 0)])
+def test_parts_datagram_with_bad_part_index_is_rejected(part, parts):
+    payload = binary_parts_payload()
+    offset = protocol._BIN_HEADER.size + 8  # past the drop id
+    payload[offset:offset + 2] = bytes([part, parts])
+    assert parse_message(KEY, sign_payload(KEY, bytes(payload))) is None
+
+
+@pytest.mark.parametrize("change", [b"\x00", -1, -protocol._BIN_GIFT.size])
+def test_parts_datagram_with_wrong_length_is_rejected(change):
+    payload = binary_parts_payload()
+    payload = payload + change if isinstance(change, bytes) else payload[:change]
+    assert parse_message(KEY, sign_payload(KEY, bytes(payload))) is None
+
+
+@pytest.mark.parametrize("fmt", [-1, 99, "x", None, [], float("inf"), float("nan")])
+def test_unknown_advertised_format_is_negotiated_safely(fmt):
+    assert negotiated_format(fmt) in FORMATS
+    assert negotiated_format(fmt) == (WIRE_FORMAT if fmt == 99 else FORMAT_JSON)
+
+
+@pytest.mark.parametrize("fmt", FORMATS)
+def test_known_format_is_kept(fmt):
+    assert negotiated_format(fmt) == fmt
+    assert negotiated_format(str(fmt)) == fmt
+
+
+def test_backend_copy_is_identical():
+    # Both sides ship their own copy of the wire contract; they must not drift
+    if not BACKEND_PROTOCOL.exists():
+        pytest.skip("Backend is not part of this checkout")
+    assert BACKEND_PROTOCOL.read_bytes() == Path(protocol.__file__).read_bytes()
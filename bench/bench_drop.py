@@ -0,0 +1,381 @@
+"""End-to-end drop simulation: scanner -> broadcaster -> listener -> buyer.
+
+Everything runs in one process on loopback:
+
+* GiftScanner polls a fake Telethon client that replays a scripted
+  GetStarGifts timeline (an initial catalog, then a new gift batch every
+  ``--drop-every`` seconds), with ``--rtt`` seconds per RPC.
+* The real UdpBroadcaster fans out to ``--frontends`` real UdpListener
+  instances; the first ``--buyers`` of them feed a GiftBuyer.
+* The buyers talk to a stub payment API with ``--pay-latency`` per RPC that
+  answers SendStarsForm with FLOOD_WAIT at rate ``--flood-rate``.
+
+Reported per drop, then as p50/p99 over all drops:
+
+* detection: catalog change -> scanner starts the broadcast
+* fan-out: broadcast start -> a frontend's listener hands the gifts over
+* first purchase: catalog change -> first successful SendStarsForm
+
+    python bench/bench_drop.py [--drops 10] [--frontends 50] [--sessions 2]
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+from types import SimpleNamespace
+
+ROOT = os.path.join(os.path.dirname(__file__), "..")
+sys.path.insert(0, os.path.join(ROOT, "Backend"))
+sys.path.insert(0, os.path.join(ROOT, "Telegram-Bot-NFT"))
+
+from telethon.errors import FloodWaitError  # noqa: E402
+
+from db.database import Database  # noqa: E402
+from engine.address_book import AddressBook  # noqa: E402
+from engine.gift_scanner import GiftScanner  # noqa: E402
+from engine.udp_broadcast import UdpBroadcaster  # noqa: E402
+from Message_Bot.balance_tracker import BalanceTracker  # noqa: E402
+from Message_Bot.connection import ConnectionSupervisor  # noqa: E402
+from Message_Bot.drop_trace import TRACE_SEGMENTS  # noqa: E402
+from Message_Bot.gift_buyer import GiftBuyer  # noqa: E402
+from Message_Bot.status_store import StatusStore  # noqa: E402
+from Message_Bot.tl_compat import tl  # noqa: E402
+from Message_Bot.udp_listener import UdpListener  # noqa: E402
+
+FIRST_GIFT_ID = 5_900_000_000_000_000_000
+
+
+class StarGiftsNotModified:
+    """Matched by class name in engine.telegram_api.get_star_gifts."""
+
+
+class Timeline:
+    """Scripted catalog plus the wall-clock record of everything that happened to it."""
+
+    def __init__(self, base_size: int, gifts_per_drop: int, supply: int, rng: random.Random):
+        self._rng = rng
+        self._gifts_per_drop = gifts_per_drop
+        self._supply = supply
+        self._next_id = FIRST_GIFT_ID
+        self.catalog = [self._gift(0) for _ in range(base_size)]
+        self.hash = 1
+        self.drop_of: dict[int, int] = {}  # gift id -> drop number
+        self.published: dict[int, float] = {}
+        self.detected: dict[int, float] = {}
+        self.received: dict[int, list[float]] = {}
+        self.first_purchase: dict[int, float] = {}
+
+    def _gift(self, supply: int) -> SimpleNamespace:
+        self._next_id += 1
+        return SimpleNamespace(
+            id=self._next_id,
+            stars=self._rng.choice([15, 25, 50, 100, 250, 500, 1000, 2500]),
+            availability_remains=supply,
+        )
+
+    def publish(self, drop: int):
+        for _ in range(self._gifts_per_drop):
+            gift = self._gift(self._supply)
+            self.drop_of[gift.id] = drop
+            self.catalog.append(gift)
+        self.hash += 1
+        self.published[drop] = time.perf_counter()
+
+    def drops_in(self, gifts: list[dict]) -> set[int]:
+        return {self.drop_of[int(g["id"])] for g in gifts if int(g["id"]) in self.drop_of}
+
+
+class FakeCatalogClient:
+    """Stands in for TelegramClient on the scanner side."""
+
+    def __init__(self, timeline: Timeline, rtt: float):
+        self._timeline = timeline
+        self._rtt = rtt
+
+    async def connect(self):
+        pass
+
+    async def disconnect(self):
+        pass
+
+    def is_connected(self) -> bool:
+        return True
+
+    async def __call__(self, request):
+        # The server sees the catalog halfway through the round trip
+        await asyncio.sleep(self._rtt / 2)
+        tl_hash, gifts = self._timeline.hash, list(self._timeline.catalog)
+        await asyncio.sleep(self._rtt / 2)
+        if request.hash == tl_hash:
+            return StarGiftsNotModified()
+        return SimpleNamespace(hash=tl_hash, gifts=gifts)
+
+
+class FakePaymentClient:
+    """Stub payment API: star balance, payment forms and SendStarsForm."""
+
+    def __init__(self, timeline: Timeline, latency: float, flood_rate: float, rng: random.Random):
+        self._timeline = timeline
+        self._latency = latency
+        self._flood_rate = flood_rate
+        self._rng = rng
+        self._forms = 0
+        self.balance = 10**9
+        self.purchases = 0
+        self.floods = 0
+
+    def is_connected(self) -> bool:
+        return True
+
+    async def connect(self):
+        pass
+
+    async def disconnect(self):
+        pass
+
+    def add_event_handler(self, callback, event=None):
+        pass
+
+    def remove_event_handler(self, callback, event=None):
+        pass
+
+    async def __call__(self, request):
+        name = type(request).__name__
+        if name == "GetStarsStatusRequest":
+            return SimpleNamespace(balance=SimpleNamespace(amount=self.balance))
+        if name == "PingRequest":
+            return SimpleNamespace(ping_id=request.ping_id)
+        await asyncio.sleep(self._latency)
+        if name == "GetPaymentFormRequest":
+            self._forms += 1
+            return SimpleNamespace(form_id=self._forms)
+        if name == "SendStarsFormRequest":
+            if self._rng.random() < self._flood_rate:
+                self.floods += 1
+                raise FloodWaitError(request=request, capture=1)
+            self.purchases += 1
+            drop = self._timeline.drop_of.get(request.invoice.gift_id)
+            if drop is not None:
+                self._timeline.first_purchase.setdefault(drop, time.perf_counter())
+            return SimpleNamespace(ok=True)
+        raise NotImplementedError(name)
+
+
+class SimScanner(GiftScanner):
+    def __init__(self, *args, timeline: Timeline, rtt: float, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._timeline = timeline
+        self._rtt = rtt
+
+    async def _connect(self, sess):
+        sess.client = FakeCatalogClient(self._timeline, self._rtt)
+        sess.catalog_hash = 0
+
+
+class SimBroadcaster(UdpBroadcaster):
+    def __init__(self, *args, timeline: Timeline, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._timeline = timeline
+
+    async def broadcast_gifts(self, frontends, gifts, trace=None):
+        now = time.perf_counter()
+        for drop in self._timeline.drops_in(gifts):
+            self._timeline.detected.setdefault(drop, now)
+        await super().broadcast_gifts(frontends, gifts, trace)
+
+
+class SimBuyer(GiftBuyer):
+    def __init__(self, *args, payments: FakePaymentClient, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._payments = payments
+
+    async def connect(self):
+        self._conn = ConnectionSupervisor(self._payments)
+        await self._conn.start()
+        self._peer = tl("InputPeerSelf")()
+        self._balance = BalanceTracker(self._payments)
+        await self._balance.start()
+        self._log.start()
+        if self._trace_log:
+            self._trace_log.start()
+
+
+def pct(values: list[float], p: float) -> float:
+    if not values:
+        return float("nan")
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))]
+
+
+def ms(seconds: float) -> str:
+    return f"{seconds * 1000:8.1f}"
+
+
+async def run(args) -> None:
+    rng = random.Random(args.seed)
+    workdir = tempfile.mkdtemp(prefix="bench_drop_")
+    timeline = Timeline(args.catalog, args.gifts_per_drop, args.supply, rng)
+
+    db = Database(os.path.join(workdir, "backend.db"))
+    await db.connect()
+    listeners: list[UdpListener] = []
+    buyers: list[SimBuyer] = []
+    payments: list[FakePaymentClient] = []
+    stores: list[StatusStore] = []
+    for i in range(args.frontends):
+        license_key = f"bench-{i:04d}"
+        listener = UdpListener(license_key, "127.0.0.1", 0)
+
+        async def on_gifts(gifts, trace, part, buyer=None):
+            now = time.perf_counter()
+            for drop in timeline.drops_in(gifts):
+                timeline.received.setdefault(drop, []).append(now)
+            if buyer is not None:
+                await buyer.handle_new_gifts(gifts, trace, part)
+
+        buyer = None
+        if i < args.buyers:
+            status = StatusStore(os.path.join(workdir, f"status-{i}.json"))
+            status.set({"isActive": True, "distribution": args.distribution})
+            stores.append(status)
+            client = FakePaymentClient(timeline, args.pay_latency, args.flood_rate, rng)
+            buyer = SimBuyer(
+                0, "", "", status, os.path.join(workdir, f"bot-{i}.log"),
+                concurrency=args.concurrency, trace_file=os.path.join(workdir, f"trace-{i}.jsonl"),
+                payments=client,
+            )
+            await buyer.connect()
+            buyers.append(buyer)
+            payments.append(client)
+        listener.on_gifts(
+            lambda gifts, trace, part, buyer=buyer: on_gifts(gifts, trace, part, buyer)
+        )
+        await listener.start()
+        listeners.append(listener)
+        await db.register_frontend(license_key)
+        await db.set_frontend_address(license_key, "127.0.0.1", listener.port)
+
+    address_book = AddressBook(db)
+    await address_book.load()
+    broadcaster = SimBroadcaster(address_book, timeline=timeline)
+    broadcaster.start()
+    await broadcaster.probe(address_book.frontends())
+
+    scanner = SimScanner(
+        db=db,
+        broadcaster=broadcaster,
+        address_book=address_book,
+        api_id=0,
+        api_hash="",
+        session_strings=[""] * args.sessions,
+        scan_interval=args.scan_interval,
+        timeline=timeline,
+        rtt=args.rtt,
+    )
+    await scanner.start()
+    await asyncio.sleep(args.scan_interval + args.rtt * 2)  # let every session learn the hash
+
+    for drop in range(args.drops):
+        # Jitter the drop time so it lands at a random phase of the poll cycle
+        await asyncio.sleep(args.drop_every * rng.uniform(0.5, 1.5))
+        timeline.publish(drop)
+    await asyncio.sleep(args.settle)
+
+    await scanner.stop()
+    broadcaster.stop()
+    for listener in listeners:
+        listener.stop()
+    for buyer in buyers:
+        await buyer.disconnect()
+    for status in stores:
+        await status.close()
+    await db.close()
+    traces = []
+    trace_file = os.path.join(workdir, "trace-0.jsonl")
+    if os.path.exists(trace_file):
+        with open(trace_file) as f:
+            traces = [json.loads(line) for line in f]
+    shutil.rmtree(workdir, ignore_errors=True)
+
+    print(
+        f"{args.drops} drops, {args.frontends} frontends ({args.buyers} buying), "
+        f"{args.sessions} sessions @ {args.scan_interval}s, rtt {args.rtt * 1000:.0f}ms, "
+        f"pay latency {args.pay_latency * 1000:.0f}ms, flood rate {args.flood_rate:.0%}"
+    )
+    print(f"{'drop':>4} {'detect ms':>9} {'fan p50':>8} {'fan p99':>8} {'recv':>5} {'1st buy ms':>10}")
+    detection, fanout, first_buy = [], [], []
+    for drop in range(args.drops):
+        published = timeline.published[drop]
+        detected = timeline.detected.get(drop)
+        received = timeline.received.get(drop, [])
+        bought = timeline.first_purchase.get(drop)
+        spread = [t - detected for t in received] if detected else []
+        if detected:
+            detection.append(detected - published)
+        fanout.extend(spread)
+        if bought:
+            first_buy.append(bought - published)
+        print(
+            f"{drop:>4} {ms(detected - published) if detected else '     miss':>9} "
+            f"{ms(pct(spread, 50))} {ms(pct(spread, 99))} {len(received):>5} "
+            f"{ms(bought - published) if bought else '      none':>10}"
+        )
+
+    print()
+    print(f"{'':<16} {'p50 ms':>8} {'p99 ms':>8} {'max ms':>8}")
+    for name, values in (
+        ("detection", detection), ("fan-out", fanout), ("first purchase", first_buy),
+    ):
+        print(f"{name:<16} {ms(pct(values, 50))} {ms(pct(values, 99))} {ms(max(values, default=float('nan')))}")
+    print()
+    print(f"{'stage (buyer 0)':<16} {'p50 ms':>8} {'p99 ms':>8} {'max ms':>8}")
+    for name, _, _ in TRACE_SEGMENTS:
+        values = [t["ms"][name] / 1000 for t in traces if t["ms"][name] is not None]
+        print(f"{name:<16} {ms(pct(values, 50))} {ms(pct(values, 99))} {ms(max(values, default=float('nan')))}")
+    print()
+    print(
+        f"broadcast: delivered {broadcaster.delivered}, expired {broadcaster.expired}, "
+        f"retransmits {broadcaster.retransmits}"
+    )
+    print(
+        f"payments: {sum(p.purchases for p in payments)} bought, "
+        f"{sum(p.floods for p in payments)} FLOOD_WAIT injected"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--drops", type=int, default=10)
+    parser.add_argument("--drop-every", type=float, default=2.0, help="mean seconds between drops")
+    parser.add_argument("--gifts-per-drop", type=int, default=3)
+    parser.add_argument("--supply", type=int, default=1000, help="availability of each new gift")
+    parser.add_argument("--catalog", type=int, default=100, help="gifts already in the catalog")
+    parser.add_argument("--frontends", type=int, default=50)
+    parser.add_argument("--buyers", type=int, default=1)
+    parser.add_argument("--sessions", type=int, default=2)
+    parser.add_argument("--scan-interval", type=float, default=1.0)
+    parser.add_argument("--rtt", type=float, default=0.05, help="seconds per GetStarGifts call")
+    parser.add_argument("--pay-latency", type=float, default=0.08, help="seconds per payment RPC")
+    parser.add_argument("--flood-rate", type=float, default=0.0)
+    parser.add_argument("--concurrency", type=int, default=3)
+    parser.add_argument("--distribution", default="<=1000 5\n>1000 2")
+    parser.add_argument("--settle", type=float, default=3.0, help="seconds to wait after the last drop")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("-v", "--verbose", action="store_true")
+    args = parser.parse_args()
+
+    logging.basicConfig(
+        format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+        level=logging.INFO if args.verbose else logging.ERROR,
+    )
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""Plan time and plan quality of the purchase planner on synthetic drops.
+
+Each catalog has gifts priced on a log scale with random remaining supply,
+and a distribution of range rules with random counts. "greedy" is the old
+price-descending planner; "planner" is ``plan_purchases`` with each
+objective. Reported: milliseconds per plan, rule slots filled and stars
+spent.
+
+    python bench/bench_planner.py [--gifts 100 1000 5000] [--rules 20] [--runs 20]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "Telegram-Bot-NFT"))
+
+from Message_Bot.distribution import RuleIndex, compile_distribution  # noqa: E402
+from Message_Bot.planner import OBJECTIVES, Slot, plan_purchases  # noqa: E402
+
+
+def make_catalog(n: int, rng: random.Random) -> list[dict]:
+    return [
+        {
+            "id": str(5_000_000_000_000_000 + i),
+            "stars": int(10 ** rng.uniform(1, 5)),
+            "availability_remains": rng.choice([1, 5, 50, 500, 5000]),
+        }
+        for i in range(n)
+    ]
+
+
+def make_distribution(rules: int, rng: random.Random) -> str:
+    lines = []
+    for _ in range(rules):
+        lo = int(10 ** rng.uniform(1, 4.5))
+        hi = int(lo * rng.uniform(1.5, 20))
+        lines.append(f">={lo} и <={hi} {rng.randint(1, 10)}")
+    return "\n".join(lines)
+
+
+def greedy_plan(gifts: list[dict], index: RuleIndex, stars: int) -> list[Slot]:
+    available = sorted(
+        (g for g in gifts if g.get("id") and (g.get("availability_remains") or 0) > 0),
+        key=lambda g: g.get("stars", 0),
+        reverse=True,
+    )
+    counts = index.counts
+    reserved = [0] * len(index)
+    plan = []
+    for gift in available:
+        applicable = index.match(gift["stars"])
+        avail = gift["availability_remains"]
+        while applicable and avail > 0 and stars >= gift["stars"]:
+            active = tuple(i for i in applicable if reserved[i] < counts[i])
+            if not active:
+                break
+            stars -= gift["stars"]
+            avail -= 1
+            for i in active:
+                reserved[i] += 1
+            plan.append(Slot(int(gift["id"]), gift["stars"], active))
+    return plan
+
+
+def measure(fn, runs: int) -> tuple[float, list[Slot]]:
+    plan = fn()
+    t0 = time.perf_counter()
+    for _ in range(runs):
+        fn()
+    return (time.perf_counter() - t0) / runs * 1000, plan
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--gifts", type=int, nargs="+", default=[100, 1000, 5000])
+    parser.add_argument("--rules", type=int, default=20)
+    parser.add_argument("--budget", type=int, default=200_000)
+    parser.add_argument("--runs", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    index = compile_distribution(make_distribution(args.rules, rng))
+    print(f"{args.rules} rules, {sum(index.counts)} slots, budget {args.budget} stars")
+    print(f"{'gifts':>6} {'planner':<16} {'ms/plan':>9} {'slots':>6} {'spent':>8}")
+    for n in args.gifts:
+        gifts = make_catalog(n, rng)
+        variants = [("greedy", lambda: greedy_plan(gifts, index, args.budget))]
+        variants += [
+            (f"planner/{name}", lambda name=name: plan_purchases(gifts, index, args.budget, name))
+            for name in OBJECTIVES
+        ]
+        for name, fn in variants:
+            ms, plan = measure(fn, args.runs)
+            slots = sum(len(s.rules) for s in plan)
+            spent = sum(s.stars for s in plan)
+            assert spent <= args.budget
+            print(f"{n:>6} {name:<16} {ms:>9.3f} {slots:>6} {spent:>8}")
+
+
+if __name__ == "__main__":
+    main()
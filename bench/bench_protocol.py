@@ -0,0 +1,68 @@
+"""Round-trip benchmark of the NFTB new_gifts wire formats.
+
+Encodes, signs and parses synthetic gift lists in the JSON and binary
+formats and reports datagram count, bytes on the wire and time per
+round trip.
+
+    python bench/bench_protocol.py [--gifts 1 10 100 1000] [--rounds 2000]
+"""
+import argparse
+import itertools
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "Backend"))
+
+from engine.protocol import (  # noqa: E402
+    FORMAT_BINARY, FORMAT_BINARY_PARTS, FORMAT_JSON, encode_gift_payloads, parse_message, sign_payload,
+)
+
+LICENSE = "bench-license-key"
+
+
+def make_gifts(n: int) -> list[dict]:
+    return [
+        {
+            "id": str(5170145012310081615 + i),
+            "stars": 15 + (i * 37) % 10000,
+            "availability_remains": 1 + (i * 13) % 5000,
+        }
+        for i in range(n)
+    ]
+
+
+def round_trip(gifts: list[dict], fmt: int, seq) -> tuple[int, int]:
+    datagrams = [sign_payload(LICENSE, p) for _, p in encode_gift_payloads(gifts, fmt, seq)]
+    for d in datagrams:
+        if parse_message(LICENSE, d) is None:
+            raise RuntimeError("round trip failed")
+    return len(datagrams), sum(len(d) for d in datagrams)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--gifts", type=int, nargs="+", default=[1, 10, 100, 1000])
+    parser.add_argument("--rounds", type=int, default=2000)
+    args = parser.parse_args()
+
+    seq = itertools.count(1).__next__
+    print(f"{'gifts':>6} {'format':>7} {'dgrams':>7} {'bytes':>8} {'max':>6} {'us/rt':>9}")
+    for n in args.gifts:
+        gifts = make_gifts(n)
+        rounds = max(1, args.rounds // max(1, n // 10))
+        for name, fmt in (
+            ("json", FORMAT_JSON), ("binary", FORMAT_BINARY), ("parts", FORMAT_BINARY_PARTS),
+        ):
+            payloads = encode_gift_payloads(gifts, fmt, seq)
+            largest = max(len(sign_payload(LICENSE, p)) for _, p in payloads)
+            count, size = round_trip(gifts, fmt, seq)
+            t0 = time.perf_counter()
+            for _ in range(rounds):
+                round_trip(gifts, fmt, seq)
+            per = (time.perf_counter() - t0) / rounds * 1e6
+            print(f"{n:>6} {name:>7} {count:>7} {size:>8} {largest:>6} {per:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""Per-call cost of resolving Telethon TL constructors.
+
+"before" repeats the lookup chain the telegram_api modules used to run on
+every purchase (try ``telethon._tl``, then getattr on the function
+namespace, then a fallback import) for the three constructors
+pay_star_gift needs. "after" goes through the cached ``tl()`` layer.
+
+    python bench/bench_tl_resolution.py [--calls 100000]
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "Backend"))
+
+from engine.tl_compat import tl  # noqa: E402
+
+
+def resolve_before():
+    try:
+        from telethon import _tl as Api
+    except ImportError:
+        Api = None
+    from telethon.tl import functions as tl_functions
+
+    InputInvoiceStarGift = getattr(Api, "InputInvoiceStarGift", None)
+    if InputInvoiceStarGift is None:
+        from telethon.tl.types import InputInvoiceStarGift
+    GetPaymentForm = getattr(getattr(Api, "payments", None), "GetPaymentFormRequest", None)
+    if GetPaymentForm is None:
+        GetPaymentForm = getattr(getattr(tl_functions, "payments", None), "GetPaymentFormRequest", None)
+    if GetPaymentForm is None:
+        from telethon.tl.functions.payments import GetPaymentFormRequest as GetPaymentForm
+    SendStarsForm = getattr(getattr(Api, "payments", None), "SendStarsFormRequest", None)
+    if SendStarsForm is None:
+        from telethon.tl.functions.payments import SendStarsFormRequest as SendStarsForm
+    return InputInvoiceStarGift, GetPaymentForm, SendStarsForm
+
+
+def resolve_after():
+    return (
+        tl("InputInvoiceStarGift"),
+        tl("payments.GetPaymentFormRequest"),
+        tl("payments.SendStarsFormRequest"),
+    )
+
+
+def bench(fn, calls: int) -> float:
+    fn()
+    t0 = time.perf_counter()
+    for _ in range(calls):
+        fn()
+    return (time.perf_counter() - t0) / calls * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--calls", type=int, default=100000)
+    args = parser.parse_args()
+
+    assert resolve_before() == resolve_after()
+    before = bench(resolve_before, args.calls)
+    after = bench(resolve_after, args.calls)
+    print(f"before: {before:8.3f} us/call")
+    print(f"after:  {after:8.3f} us/call  ({before / after:.0f}x faster)")
+
+
+if __name__ == "__main__":
+    main()